@@ -0,0 +1,95 @@
+"""
+Cache read-through di memori untuk lookup yang sering diulang (GrowID, saldo).
+
+Cache hanya dipakai dari event loop bot. Penulis memanggil invalidate()
+setelah transaksinya di-commit; pengisian yang dimulai sebelum invalidate
+dibuang (dijaga dengan generation) sehingga nilai lama tidak masuk kembali.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+
+class TTLCache:
+    def __init__(self, name, maxsize, ttl):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._items = OrderedDict()  # key -> (expires_at, value)
+        self._inflight = {}          # key -> future load yang sedang berjalan
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key, loader):
+        """Kembalikan nilai key; bila tidak ada atau kedaluwarsa, panggil `await loader()`."""
+        entry = self._items.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                self._items.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            del self._items[key]
+
+        self.misses += 1
+        # Banyak permintaan key yang sama menunggu satu query saja
+        pending = self._inflight.get(key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        generation = self._generation
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Hindari "exception was never retrieved" bila tidak ada penunggu lain
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        if not future.done():
+            future.set_result(value)
+        if generation == self._generation:
+            self._put(key, value)
+        return value
+
+    def _put(self, key, value):
+        self._items[key] = (time.monotonic() + self.ttl, value)
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+
+    def invalidate(self, *keys):
+        self._generation += 1
+        for key in keys:
+            self._items.pop(key, None)
+            # Penunggu berikutnya harus membaca ulang, bukan ikut load lama
+            self._inflight.pop(key, None)
+
+    def clear(self):
+        self._generation += 1
+        self._items.clear()
+        self._inflight.clear()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'name': self.name,
+            'size': len(self._items),
+            'maxsize': self.maxsize,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+# user_id -> growid
+growids = TTLCache('growid', maxsize=10000, ttl=300)
+# growid -> saldo WL
+balances = TTLCache('balance', maxsize=10000, ttl=30)
+
+CACHES = (growids, balances)
@@ -0,0 +1,77 @@
+"""
+Katalog produk di memori.
+
+Dimuat sekali saat startup (catalog.reload()) lalu diperbarui oleh perintah
+admin yang mengubah products setelah transaksinya di-commit. Setiap
+perubahan menaikkan catalog.version. Harga dan keberadaan produk dibaca dari
+sini tanpa query; stock tetap dibaca dari database karena berubah di setiap
+pembelian.
+
+Kode produk juga disimpan terurut (huruf kecil) sehingga autocomplete slash
+command cukup melakukan bisect, tanpa menyentuh SQLite di setiap ketikan.
+"""
+import bisect
+from collections import namedtuple
+from database import db
+
+AUTOCOMPLETE_LIMIT = 25  # batas pilihan autocomplete dari Discord
+
+Product = namedtuple('Product', 'code name price description')
+
+SQL_PRODUCTS = "SELECT code, name, price, description FROM products"
+SQL_PRODUCT = SQL_PRODUCTS + " WHERE code = ?"
+
+class Catalog:
+    def __init__(self):
+        self._products = {}  # code -> Product
+        self._index = []     # [(code.lower(), code)] terurut, untuk pencarian prefix
+        self.version = 0
+        self.loaded = False
+
+    def _rebuild_index(self):
+        self._index = sorted((code.lower(), code) for code in self._products)
+
+    async def reload(self):
+        """Muat ulang seluruh katalog dari database."""
+        while True:
+            version = self.version
+            rows = await db.fetchall(SQL_PRODUCTS)
+            # Perubahan admin selama query berjalan: baca ulang agar tidak tertimpa
+            if version == self.version:
+                break
+        self._products = {row[0]: Product(*row) for row in rows}
+        self._rebuild_index()
+        self.version += 1
+        self.loaded = True
+
+    async def refresh(self, code):
+        """Baca ulang satu produk setelah perubahannya di-commit."""
+        row = await db.fetchone(SQL_PRODUCT, (code,))
+        if row is None:
+            self._products.pop(code, None)
+        else:
+            self._products[code] = Product(*row)
+        self._rebuild_index()
+        self.version += 1
+
+    def get(self, code):
+        return self._products.get(code)
+
+    def __contains__(self, code):
+        return code in self._products
+
+    def __len__(self):
+        return len(self._products)
+
+    def complete(self, prefix, limit=AUTOCOMPLETE_LIMIT):
+        """Produk yang kodenya diawali `prefix` (tanpa membedakan huruf besar/kecil)."""
+        prefix = prefix.lower()
+        start = bisect.bisect_left(self._index, (prefix,))
+        matches = []
+        for key, code in self._index[start:start + limit]:
+            if not key.startswith(prefix):
+                break
+            matches.append(self._products[code])
+        return matches
+
+catalog = Catalog()
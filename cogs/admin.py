@@ -1,34 +1,99 @@
 import discord
 from discord.ext import commands
+import asyncio
+import csv
+import io
 import logging
 import datetime
 from main import is_admin  # Import is_admin function from main.py
-from database import get_connection, add_balance, subtract_balance
+from database import db, get_world_info, SQL_STOCK_STATS, claim_stock, InsufficientStock, InsufficientBalance, ProductUnavailable
+from cache import CACHES
+from catalog import catalog
+from delivery import dm_sends
+from outbound import outbound, dm_route, PRIORITY_DM
+from ext.balance_manager import add_balance, subtract_balance, get_ledger, to_wl
+from stock_import import import_stock, iter_lines, UnknownProduct, BATCH_SIZE
 
 DATABASE = 'store.db'
+PROGRESS_INTERVAL = 3  # detik antar update progress addStock
+BULK_MAX_ROWS = 1000
+USER_LOOKUP_CONCURRENCY = 5  # fetch_user paralel maksimal untuk bulkSend
+
+def grant_items(conn, user_id, used_by, code, count, used_at):
+    """Klaim item untuk user dan catat di user_products; harus di dalam transaksi."""
+    items = claim_stock(conn, code, count, used_by, used_at)
+
+    # Update user products
+    conn.execute("""
+        INSERT OR REPLACE INTO user_products (user_id, product, count) 
+        VALUES (?, ?, COALESCE((SELECT count FROM user_products WHERE user_id = ? AND product = ?), 0) + ?)
+    """, (user_id, code, user_id, code, count))
+    return items
+
+def parse_grant_rows(text):
+    """
+    Baca CSV user,code,count (user berupa ID atau mention; baris header dan
+    baris kosong dilewati). Kembalikan (rows, errors) dengan
+    rows = [(baris, user_id, code, count)] dan errors = [(baris, isi, pesan)].
+    """
+    rows = []
+    errors = []
+    for line_no, record in enumerate(csv.reader(io.StringIO(text)), 1):
+        fields = [field.strip() for field in record]
+        if not any(fields) or fields[0].startswith('#'):
+            continue
+        raw = ','.join(fields)
+        if len(fields) != 3:
+            errors.append((line_no, raw, "expected user,code,count"))
+            continue
+        user, code, count = fields
+        if line_no == 1 and not count.isdigit():
+            continue  # header
+        user = user.strip('<@!>')
+        if not user.isdigit():
+            errors.append((line_no, raw, "invalid user"))
+        elif not count.isdigit() or int(count) < 1:
+            errors.append((line_no, raw, "invalid count"))
+        elif code not in catalog:
+            errors.append((line_no, raw, "unknown product"))
+        else:
+            rows.append((line_no, int(user), code, int(count)))
+    return rows, errors
+
+def bulk_grant_txn(conn, grants, used_at):
+    """
+    Klaim stock untuk semua baris dalam satu transaksi; setiap baris memakai
+    SAVEPOINT sehingga baris yang kekurangan stock tidak membatalkan yang lain.
+    grants = [(user, code, count)]; kembalikan items atau exception per baris.
+    """
+    results = []
+    for user, code, count in grants:
+        conn.execute("SAVEPOINT grant_row")
+        try:
+            results.append(grant_items(conn, user.id, str(user), code, count, used_at))
+        except InsufficientStock as e:
+            conn.execute("ROLLBACK TO grant_row")
+            results.append(e)
+        conn.execute("RELEASE grant_row")
+    return results
 
 class AdminCommands(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
         self.current_time = datetime.datetime.utcnow()
 
-    def db_connect(self):
-        return get_connection()
-
     @commands.command()
     @is_admin()
     async def addProduct(self, ctx, name: str, code: str, price: int, description: str = ""):
         logging.info(f'addProduct command invoked by {ctx.author}')
+        if await db.fetchone("SELECT 1 FROM stock_deletions WHERE product_code = ?", (code,)):
+            await ctx.send(f"❌ Stock of the old product {code} is still being removed. Try again later.")
+            return
         try:
-            conn = self.db_connect()
-            if conn is None:
-                await ctx.send("Database connection failed.")
-                return
-            cursor = conn.cursor()
-            cursor.execute("INSERT INTO products (name, code, price, stock, description) VALUES (?, ?, ?, 0, ?)", 
-                         (name, code, price, description))
-            conn.commit()
-            conn.close()
+            await db.execute("INSERT INTO products (name, code, price, stock, description) VALUES (?, ?, ?, 0, ?)", 
+                             (name, code, price, description))
+            await catalog.refresh(code)
+            self.bot.dispatch('store_update', code)
             await ctx.send(f"Product {name} with code {code} added with price {price}.")
         except Exception as e:
             logging.error(f'Error in addProduct: {e}')
@@ -42,87 +107,68 @@ class AdminCommands(commands.Cog):
         Usage: !addStock <kode_produk> [file_path]
         """
         logging.info(f'addStock command invoked by {ctx.author} at {self.current_time}')
+        if product_code not in catalog:
+            await ctx.send(f"❌ Product {product_code} not found.")
+            return
         try:
-            # Handle file path
-            if file_path is None:
-                if len(ctx.message.attachments) > 0:
-                    attachment = ctx.message.attachments[0]
-                    await attachment.save(attachment.filename)
-                    file_path = attachment.filename
-                else:
-                    file_path = f'{product_code}.txt'
-
-            # Membaca dan memproses file
-            with open(file_path, 'r', encoding='utf-8') as file:
-                lines = file.readlines()
-                valid_lines = [line.strip() for line in lines if line.strip()]
-                count = len(valid_lines)
-
-                if count == 0:
-                    await ctx.send("❌ File is empty or contains no valid content.")
-                    return
-
-                conn = self.db_connect()
-                if conn is None:
-                    await ctx.send("Database connection failed.")
-                    return
-
-                cursor = conn.cursor()
-
-                # Create product_stock table if not exists
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS product_stock (
-                        id INTEGER PRIMARY KEY AUTOINCREMENT,
-                        product_code TEXT,
-                        content TEXT,
-                        used INTEGER DEFAULT 0,
-                        used_by TEXT DEFAULT NULL,
-                        used_at TIMESTAMP DEFAULT NULL,
-                        added_by TEXT,
-                        added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        source_file TEXT,
-                        FOREIGN KEY (product_code) REFERENCES products (code)
-                    )
-                """)
-
-                # Verify product exists
-                cursor.execute("SELECT code FROM products WHERE code = ?", (product_code,))
-                if not cursor.fetchone():
-                    await ctx.send(f"❌ Product with code {product_code} does not exist.")
-                    conn.close()
-                    return
-
-                # Update stock count
-                cursor.execute("UPDATE products SET stock = stock + ? WHERE code = ?", 
-                             (count, product_code))
-
-                # Insert stock items
-                for content in valid_lines:
-                    cursor.execute("""
-                        INSERT INTO product_stock (
-                            product_code, content, added_by, source_file
-                        ) VALUES (?, ?, ?, ?)
-                    """, (product_code, content, str(ctx.author), file_path))
-
-                conn.commit()
-                conn.close()
+            # Handle file path; attachment dibaca ke memori, tidak disimpan ke disk
+            if file_path is None and len(ctx.message.attachments) > 0:
+                attachment = ctx.message.attachments[0]
+                stream = io.BytesIO(await attachment.read())
+                source_file = attachment.filename
+            else:
+                source_file = file_path or f'{product_code}.txt'
+                stream = open(source_file, 'rb')
+
+            # Import berjalan di writer thread; progress dilaporkan dari sana
+            progress = {'added': 0, 'duplicates': 0}
+            def on_progress(added, duplicates):
+                progress.update(added=added, duplicates=duplicates)
+
+            with stream:
+                task = asyncio.ensure_future(db.write(
+                    import_stock, product_code, iter_lines(stream), str(ctx.author), source_file,
+                    BATCH_SIZE, on_progress
+                ))
+                status = None
+                while not task.done():
+                    await asyncio.wait({task}, timeout=PROGRESS_INTERVAL)
+                    if not task.done():
+                        text = (f"⏳ Importing stock for {product_code}: {progress['added']:,} items so far, "
+                                f"{progress['duplicates']:,} duplicates skipped...")
+                        if status is None:
+                            status = await ctx.send(text)
+                        else:
+                            await status.edit(content=text)
+                count, duplicates = await task
+
+            self.bot.dispatch('store_update', product_code)
+            if status is not None:
+                await status.delete()
+
+            if count == 0 and duplicates == 0:
+                await ctx.send("❌ File is empty or contains no valid content.")
+                return
 
-                # Send confirmation
-                embed = discord.Embed(
-                    title="Stock Added Successfully",
-                    color=discord.Color.green(),
-                    timestamp=self.current_time
-                )
-                embed.add_field(name="Product Code", value=product_code, inline=True)
-                embed.add_field(name="Items Added", value=str(count), inline=True)
-                embed.add_field(name="Source File", value=file_path, inline=True)
-                embed.set_footer(text=f"Added by {ctx.author}")
+            # Send confirmation
+            embed = discord.Embed(
+                title="Stock Added Successfully",
+                color=discord.Color.green(),
+                timestamp=self.current_time
+            )
+            embed.add_field(name="Product Code", value=product_code, inline=True)
+            embed.add_field(name="Items Added", value=str(count), inline=True)
+            embed.add_field(name="Duplicates Skipped", value=str(duplicates), inline=True)
+            embed.add_field(name="Source File", value=source_file, inline=True)
+            embed.set_footer(text=f"Added by {ctx.author}")
 
-                await ctx.send(embed=embed)
+            await ctx.send(embed=embed)
 
         except FileNotFoundError:
             logging.error(f'File not found: {file_path}')
-            await ctx.send(f"❌ File not found: {file_path}")
+            await ctx.send(f"❌ File not found: {source_file}")
+        except UnknownProduct as e:
+            await ctx.send(f"❌ {e}")
         except Exception as e:
             logging.error(f'Error in addStock: {e}')
             await ctx.send(f"❌ An error occurred: {e}")
@@ -131,17 +177,20 @@ class AdminCommands(commands.Cog):
     @is_admin()
     async def deleteProduct(self, ctx, code: str):
         logging.info(f'deleteProduct command invoked by {ctx.author}')
+        if code not in catalog:
+            await ctx.send(f"❌ Product {code} not found.")
+            return
         try:
-            conn = self.db_connect()
-            if conn is None:
-                await ctx.send("Database connection failed.")
-                return
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM products WHERE code = ?", (code,))
-            cursor.execute("DELETE FROM product_stock WHERE product_code = ?", (code,))  # Delete related stock
-            conn.commit()
-            conn.close()
-            await ctx.send(f"Product with code {code} and its stock deleted.")
+            def delete_product(conn):
+                conn.execute("DELETE FROM products WHERE code = ?", (code,))
+                # Stock dihapus per batch oleh ext/maintenance.py, bukan dalam satu transaksi besar
+                conn.execute("INSERT OR REPLACE INTO stock_deletions (product_code) VALUES (?)", (code,))
+
+            await db.write(delete_product)
+            await catalog.refresh(code)
+            self.bot.dispatch('stock_cleanup')
+            self.bot.dispatch('store_update', code)
+            await ctx.send(f"Product with code {code} deleted. Its stock is being removed in the background.")
         except Exception as e:
             logging.error(f'Error in deleteProduct: {e}')
             await ctx.send(f"An error occurred: {e}")
@@ -150,15 +199,13 @@ class AdminCommands(commands.Cog):
     @is_admin()
     async def changePrice(self, ctx, code: str, new_price: int):
         logging.info(f'changePrice command invoked by {ctx.author}')
+        if code not in catalog:
+            await ctx.send(f"❌ Product {code} not found.")
+            return
         try:
-            conn = self.db_connect()
-            if conn is None:
-                await ctx.send("Database connection failed.")
-                return
-            cursor = conn.cursor()
-            cursor.execute("UPDATE products SET price = ? WHERE code = ?", (new_price, code))
-            conn.commit()
-            conn.close()
+            await db.execute("UPDATE products SET price = ? WHERE code = ?", (new_price, code))
+            await catalog.refresh(code)
+            self.bot.dispatch('store_update', code)
             await ctx.send(f"Price of product with code {code} changed to {new_price}.")
         except Exception as e:
             logging.error(f'Error in changePrice: {e}')
@@ -168,15 +215,13 @@ class AdminCommands(commands.Cog):
     @is_admin()
     async def setDescription(self, ctx, code: str, *, description: str):
         logging.info(f'setDescription command invoked by {ctx.author}')
+        if code not in catalog:
+            await ctx.send(f"❌ Product {code} not found.")
+            return
         try:
-            conn = self.db_connect()
-            if conn is None:
-                await ctx.send("Database connection failed.")
-                return
-            cursor = conn.cursor()
-            cursor.execute("UPDATE products SET description = ? WHERE code = ?", (description, code))
-            conn.commit()
-            conn.close()
+            await db.execute("UPDATE products SET description = ? WHERE code = ?", (description, code))
+            await catalog.refresh(code)
+            self.bot.dispatch('store_update', code)
             await ctx.send(f"Description of product with code {code} set.")
         except Exception as e:
             logging.error(f'Error in setDescription: {e}')
@@ -187,24 +232,16 @@ class AdminCommands(commands.Cog):
     async def setWorld(self, ctx, world: str, owner: str, bot_name: str):
         logging.info(f'setWorld command invoked by {ctx.author}')
         try:
-            conn = self.db_connect()
-            if conn is None:
-                await ctx.send("Database connection failed.")
-                return
-            cursor = conn.cursor()
-            cursor.execute("SELECT world, owner, bot FROM world_info WHERE id = 1")
-            existing_world_info = cursor.fetchone()
+            existing_world_info = await get_world_info()
             
             if existing_world_info:
                 if existing_world_info == (world, owner, bot_name):
                     await ctx.send(f"World info is already set to {world} with owner {owner} and bot {bot_name}.")
-                    conn.close()
                     return
 
-            cursor.execute("INSERT OR REPLACE INTO world_info (id, world, owner, bot) VALUES (1, ?, ?, ?)", 
-                         (world, owner, bot_name))
-            conn.commit()
-            conn.close()
+            await db.execute("INSERT OR REPLACE INTO world_info (id, world, owner, bot) VALUES (1, ?, ?, ?)", 
+                             (world, owner, bot_name))
+            self.bot.dispatch('store_update')
             await ctx.send(f"World set to {world} with owner {owner} and bot {bot_name}.")
         except Exception as e:
             logging.error(f'Error in setWorld: {e}')
@@ -214,76 +251,145 @@ class AdminCommands(commands.Cog):
     @is_admin()
     async def send(self, ctx, user: discord.User, code: str, count: int):
         logging.info(f'send command invoked by {ctx.author}')
+        if count < 1:
+            await ctx.send("❌ Count must be at least 1.")
+            return
+        if code not in catalog:
+            await ctx.send(f"❌ Product {code} not found.")
+            return
         try:
-            conn = self.db_connect()
-            if conn is None:
-                await ctx.send("Database connection failed.")
+            current_time = datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+            try:
+                items = await db.write(grant_items, user.id, str(user), code, count, current_time)
+            except ProductUnavailable as e:
+                await ctx.send(f"❌ {e}")
                 return
-            cursor = conn.cursor()
-
-            # Get available stock items
-            cursor.execute("""
-                SELECT id, content 
-                FROM product_stock 
-                WHERE product_code = ? AND used = 0 
-                LIMIT ?
-            """, (code, count))
-            
-            items = cursor.fetchall()
-            if not items or len(items) < count:
+            except InsufficientStock:
                 await ctx.send("Not enough stock available.")
-                conn.close()
                 return
-
-            # Update stock status
-            current_time = self.current_time.strftime('%Y-%m-%d %H:%M:%S')
-            for item_id, _ in items:
-                cursor.execute("""
-                    UPDATE product_stock 
-                    SET used = 1, used_by = ?, used_at = ? 
-                    WHERE id = ?
-                """, (str(user), current_time, item_id))
-
-            # Update product stock count
-            cursor.execute("UPDATE products SET stock = stock - ? WHERE code = ?", (count, code))
-            
-            # Update user products
-            cursor.execute("""
-                INSERT OR REPLACE INTO user_products (user_id, product, count) 
-                VALUES (?, ?, COALESCE((SELECT count FROM user_products WHERE user_id = ? AND product = ?), 0) + ?)
-            """, (user.id, code, user.id, code, count))
-
-            conn.commit()
-            conn.close()
-
-            # Send items to user
-            try:
-                content_message = f"You received {count} items of {code}:\n\n"
-                for i, (_, content) in enumerate(items, 1):
-                    content_message += f"{i}. {content}\n"
-
-                if len(content_message) > 1900:
-                    parts = [content_message[i:i+1900] for i in range(0, len(content_message), 1900)]
-                    for part in parts:
-                        await user.send(part)
-                else:
-                    await user.send(content_message)
-                
+            self.bot.dispatch('store_update', code)
+
+            # Send items to user; item sudah di-commit, DM dikirim lewat outbound
+            sends = dm_sends(
+                user,
+                f"You received {count} items of {code}:",
+                (f"{i}. {content}" for i, (_, content) in enumerate(items, 1)),
+                f"{code} ({count} items)",
+            )
+            deliveries = [
+                outbound.enqueue(dm_route(user), send, PRIORITY_DM, f"send {code} to {user}")
+                for send in sends
+            ]
+            if all(await asyncio.gather(*deliveries)):
                 await ctx.send(f"✅ Successfully sent {count} of product with code {code} to {user.name}.")
-            except discord.Forbidden:
+            else:
                 await ctx.send("❌ Could not send DM to user. Items were sent but user needs to enable DMs.")
 
         except Exception as e:
             logging.error(f'Error in send: {e}')
             await ctx.send(f"An error occurred: {e}")
 
+    @commands.command()
+    @is_admin()
+    async def bulkSend(self, ctx, *, rows: str = None):
+        """
+        Kirim item ke banyak user sekaligus
+        Usage: !bulkSend dengan lampiran CSV (user,code,count), atau baris CSV setelah perintah
+        """
+        logging.info(f'bulkSend command invoked by {ctx.author}')
+        try:
+            if ctx.message.attachments:
+                text = (await ctx.message.attachments[0].read()).decode('utf-8-sig')
+            elif rows:
+                text = rows.strip('`')
+            else:
+                await ctx.send("❌ Attach a CSV file or add rows as `user,code,count`.")
+                return
+
+            parsed, errors = parse_grant_rows(text)
+            if len(parsed) > BULK_MAX_ROWS:
+                await ctx.send(f"❌ At most {BULK_MAX_ROWS} rows per bulk send.")
+                return
+            report = [(line_no, raw, 'failed', error) for line_no, raw, error in errors]
+
+            # Resolve user; fetch_user dibatasi supaya tidak memicu rate limit
+            semaphore = asyncio.Semaphore(USER_LOOKUP_CONCURRENCY)
+            async def resolve(user_id):
+                user = self.bot.get_user(user_id)
+                if user is not None:
+                    return user
+                async with semaphore:
+                    try:
+                        return await self.bot.fetch_user(user_id)
+                    except discord.HTTPException:
+                        return None
+
+            user_ids = list({user_id for _, user_id, _, _ in parsed})
+            users = dict(zip(user_ids, await asyncio.gather(*(resolve(user_id) for user_id in user_ids))))
+
+            grants = []
+            for line_no, user_id, code, count in parsed:
+                raw = f"{user_id},{code},{count}"
+                if users[user_id] is None:
+                    report.append((line_no, raw, 'failed', 'user not found'))
+                else:
+                    grants.append((line_no, raw, users[user_id], code, count))
+
+            current_time = datetime.datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+            results = await db.write(
+                bulk_grant_txn, [(user, code, count) for _, _, user, code, count in grants], current_time
+            ) if grants else []
+
+            # Stock sudah di-commit; DM dikirim lewat outbound secara paralel
+            deliveries = []
+            for (line_no, raw, user, code, count), result in zip(grants, results):
+                if isinstance(result, Exception):
+                    report.append((line_no, raw, 'failed', str(result)))
+                    continue
+                sends = dm_sends(
+                    user,
+                    f"You received {count} items of {code}:",
+                    (f"{i}. {content}" for i, (_, content) in enumerate(result, 1)),
+                    f"{code} ({count} items)",
+                )
+                futures = [outbound.enqueue(dm_route(user), send, PRIORITY_DM, f"bulk send {code} to {user}")
+                           for send in sends]
+                deliveries.append((line_no, raw, asyncio.gather(*futures)))
+            for code in {code for _, _, _, code, _ in grants}:
+                self.bot.dispatch('store_update', code)
+
+            for line_no, raw, delivered in deliveries:
+                if all(await delivered):
+                    report.append((line_no, raw, 'sent', ''))
+                else:
+                    report.append((line_no, raw, 'granted', 'items claimed but DM failed'))
+
+            report.sort()
+            output = io.StringIO()
+            writer = csv.writer(output)
+            writer.writerow(['line', 'row', 'status', 'detail'])
+            writer.writerows(report)
+            counts = {status: sum(1 for row in report if row[2] == status) for status in ('sent', 'granted', 'failed')}
+            await ctx.send(
+                f"Bulk send finished: {counts['sent']} sent, {counts['granted']} granted without DM, "
+                f"{counts['failed']} failed.",
+                file=discord.File(io.BytesIO(output.getvalue().encode('utf-8')), filename="bulk_send_report.csv")
+            )
+        except Exception as e:
+            logging.error(f'Error in bulkSend: {e}')
+            await ctx.send(f"An error occurred: {e}")
+
     @commands.command()
     @is_admin()
     async def addBal(self, ctx, growid: str, wl: int = 0, dl: int = 0, bgl: int = 0):
         logging.info(f'addBal command invoked by {ctx.author}')
+        if to_wl(wl, dl, bgl) <= 0:
+            await ctx.send("❌ Amount must be positive.")
+            return
         try:
-            add_balance(growid, wl, dl, bgl)
-            await ctx.send(f"Added {wl} WL, {dl} DL, {bgl} BGL to {growid}'s balance.")
+            balance = await add_balance(growid, wl, dl, bgl, ref=f"admin:{ctx.author.id}")
+            await ctx.send(f"Added {wl} WL, {dl} DL, {bgl} BGL to {growid}'s balance. New balance: {balance:,} WL.")
         except Exception as e:
             logging.error(f'Error in addBal: {e}')
             await ctx.send(f"An error occurred: {e}")
@@ -292,37 +398,65 @@ class AdminCommands(commands.Cog):
     @is_admin()
     async def reduceBal(self, ctx, growid: str, wl: int = 0, dl: int = 0, bgl: int = 0):
         logging.info(f'reduceBal command invoked by {ctx.author}')
+        if to_wl(wl, dl, bgl) <= 0:
+            await ctx.send("❌ Amount must be positive.")
+            return
         try:
-            subtract_balance(growid, wl, dl, bgl)
-            await ctx.send(f"Reduced {wl} WL, {dl} DL, {bgl} BGL from {growid}'s balance.")
+            balance = await subtract_balance(growid, wl, dl, bgl, ref=f"admin:{ctx.author.id}")
+            await ctx.send(f"Reduced {wl} WL, {dl} DL, {bgl} BGL from {growid}'s balance. New balance: {balance:,} WL.")
+        except InsufficientBalance:
+            await ctx.send(f"❌ {growid} does not have enough balance.")
         except Exception as e:
             logging.error(f'Error in reduceBal: {e}')
             await ctx.send(f"An error occurred: {e}")
 
+    @commands.command()
+    @is_admin()
+    async def ledger(self, ctx, growid: str, limit: int = 10):
+        logging.info(f'ledger command invoked by {ctx.author}')
+        try:
+            entries = await get_ledger(growid, min(max(limit, 1), 50))
+            if not entries:
+                await ctx.send(f"No ledger entries for {growid}.")
+                return
+            lines = [f"`#{entry_id}` {created_at} **{delta:+,} WL** → {balance_after:,} WL ({kind}{f' {ref}' if ref else ''})"
+                     for entry_id, delta, balance_after, kind, ref, created_at in entries]
+            await ctx.send(f"Ledger for **{growid}**:\n" + "\n".join(lines))
+        except Exception as e:
+            logging.error(f'Error in ledger: {e}')
+            await ctx.send(f"An error occurred: {e}")
+
+    @commands.command()
+    @is_admin()
+    async def cacheStats(self, ctx):
+        logging.info(f'cacheStats command invoked by {ctx.author}')
+        lines = [f"**{stats['name']}**: {stats['size']}/{stats['maxsize']} entries, TTL {stats['ttl']}s, "
+                 f"{stats['hits']} hits / {stats['misses']} misses ({stats['hit_rate']:.1%})"
+                 for stats in (cache.stats() for cache in CACHES)]
+        await ctx.send("\n".join(lines))
+
+    @commands.command()
+    @is_admin()
+    async def outboundStats(self, ctx):
+        logging.info(f'outboundStats command invoked by {ctx.author}')
+        stats = outbound.stats()
+        lines = [f"{stats['queued']} queued on {stats['routes']} routes, {stats['sent']} sent, "
+                 f"{stats['retried']} retries, {stats['dead_letters']} dead letters"]
+        for description, attempts, error in list(outbound.dead_letters)[-5:]:
+            lines.append(f"• dropped {description} after {attempts} attempts: {error}"[:200])
+        await ctx.send("\n".join(lines))
+
     @commands.command()
     @is_admin()
     async def checkStock(self, ctx, product_code: str):
         logging.info(f'checkStock command invoked by {ctx.author}')
+        product = catalog.get(product_code)
+        if product is None:
+            await ctx.send(f"❌ Product {product_code} not found.")
+            return
         try:
-            conn = self.db_connect()
-            if conn is None:
-                await ctx.send("Database connection failed.")
-                return
-                
-            cursor = conn.cursor()
+            stats = await db.fetchone(SQL_STOCK_STATS, (product_code,))
             
-            cursor.execute("""
-                SELECT 
-                    COUNT(CASE WHEN used = 0 THEN 1 END) as available,
-                    COUNT(CASE WHEN used = 1 THEN 1 END) as used,
-                    COUNT(*) as total,
-                    MAX(added_at) as last_added,
-                    MAX(used_at) as last_used
-                FROM product_stock 
-                WHERE product_code = ?
-            """, (product_code,))
-            
-            stats = cursor.fetchone()
             if stats:
                 available, used, total, last_added, last_used = stats
                 
@@ -335,6 +469,7 @@ class AdminCommands(commands.Cog):
                 embed.add_field(name="Available", value=f"`{available}`", inline=True)
                 embed.add_field(name="Used", value=f"`{used}`", inline=True)
                 embed.add_field(name="Total", value=f"`{total}`", inline=True)
+                embed.add_field(name="Price", value=f"`{product.price} WL`", inline=True)
                 
                 if last_added:
                     embed.add_field(name="Last Added", value=last_added, inline=False)
@@ -345,8 +480,6 @@ class AdminCommands(commands.Cog):
             else:
                 await ctx.send(f"No stock information found for product {product_code}")
             
-            conn.close()
-            
         except Exception as e:
             logging.error(f'Error in checkStock: {e}')
             await ctx.send(f"An error occurred: {e}")
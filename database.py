@@ -1,139 +1,370 @@
+import asyncio
+import hashlib
+import logging
 import sqlite3
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from cache import growids, balances
+from migrations import MIGRATIONS
 
 DATABASE = 'store.db'
+READER_THREADS = 4
+
+# Diterapkan pada setiap koneksi. WAL membuat pembaca (live stock) tidak
+# menunggu penulis (pembelian, donasi) dan sebaliknya.
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA cache_size = -16000",      # ~16 MB per koneksi
+    "PRAGMA mmap_size = 268435456",    # 256 MB
+    "PRAGMA temp_store = MEMORY",
+)
+
+# Query yang dijalankan di jalur panas (pembelian, live stock, cek stock).
+# Rencana eksekusinya diperiksa oleh check_query_plans().
+# Klaim N item dalam satu statement. "AND used = 0" di luar subquery
+# memastikan item yang sudah diklaim transaksi lain tidak ikut terambil.
+SQL_CLAIM_ITEMS = """
+    UPDATE product_stock
+    SET used = 1, used_by = ?, used_at = ?
+    WHERE id IN (
+        SELECT id FROM product_stock
+        WHERE product_code = ? AND used = 0
+        ORDER BY id
+        LIMIT ?
+    ) AND used = 0
+    RETURNING id, content
+"""
+
+SQL_STOCK_STATS = """
+    SELECT
+        COUNT(CASE WHEN used = 0 THEN 1 END) as available,
+        COUNT(CASE WHEN used = 1 THEN 1 END) as used,
+        COUNT(*) as total,
+        MAX(added_at) as last_added,
+        MAX(used_at) as last_used
+    FROM product_stock
+    WHERE product_code = ?
+"""
+
+# products.stock dijaga tetap sama dengan jumlah item used = 0 oleh
+# claim_stock, import_stock dan migrasi 5, jadi board tidak perlu
+# menghitung ulang product_stock
+SQL_LIVE_STOCK = """
+    SELECT p.name, p.code, p.stock, p.price, p.description
+    FROM products p
+    ORDER BY p.name
+"""
+
+# Maintenance di background (ext/maintenance.py): hapus stock produk yang
+# sudah dihapus dan pindahkan item terjual lama ke arsip, per batch
+SQL_DELETE_STOCK_BATCH = """
+    DELETE FROM product_stock
+    WHERE id IN (
+        SELECT id FROM product_stock
+        WHERE product_code = ?
+        LIMIT ?
+    )
+"""
+
+SQL_ARCHIVE_STOCK_BATCH = """
+    DELETE FROM product_stock
+    WHERE id IN (
+        SELECT id FROM product_stock
+        WHERE used = 1 AND used_at < ?
+        ORDER BY used_at
+        LIMIT ?
+    )
+    RETURNING id, product_code, content, content_hash, used_by, used_at, added_by, added_at, source_file
+"""
+
+# Dipakai claim_stock; 0 baris berubah berarti produk sudah dihapus
+SQL_TAKE_PRODUCT_STOCK = "UPDATE products SET stock = stock - ? WHERE code = ?"
+
+SQL_NEXT_ORDER_NUMBER = "UPDATE sequences SET value = value + 1 WHERE name = 'order' RETURNING value"
+
+SQL_GROWID_BY_USER = "SELECT growid FROM user_growid WHERE user_id = ?"
+
+# Cek kiriman ulang donasi tanpa deposit ID (ext/donate.py). Rentang
+# deposit_key "<key>@..." memakai primary key; '@' < 'A'
+SQL_RECENT_DONATION = """
+    SELECT 1 FROM donations
+    WHERE deposit_key >= ? AND deposit_key < ?
+    AND received_at >= datetime('now', ?)
+    LIMIT 1
+"""
+
+def hot_queries():
+    """
+    Query panas beserta parameter contoh dan tabel yang boleh di-scan penuh:
+    nama -> (sql, parameter, tabel). SQL-nya adalah konstanta yang dijalankan
+    kode, jadi perubahan query langsung ikut diperiksa check_query_plans().
+    """
+    # Diimpor di sini karena modul-modul ini mengimpor database
+    import catalog
+    import stock_import
+    from ext import balance_manager
+
+    queries = {
+        'claim_items': (SQL_CLAIM_ITEMS, ('USER', 'NOW', 'CODE', 1), ()),
+        'take_product_stock': (SQL_TAKE_PRODUCT_STOCK, (1, 'CODE'), ()),
+        'stock_stats': (SQL_STOCK_STATS, ('CODE',), ()),
+        'live_stock': (SQL_LIVE_STOCK, (), ('p',)),  # daftar semua produk memang scan products
+        'next_order_number': (SQL_NEXT_ORDER_NUMBER, (), ()),
+        'growid_by_user': (SQL_GROWID_BY_USER, (1,), ()),
+        'recent_donation': (SQL_RECENT_DONATION, ('sha256:x#0@', 'sha256:x#0A', '-120 seconds'), ()),
+        'delete_stock_batch': (SQL_DELETE_STOCK_BATCH, ('CODE', 5000), ()),
+        'archive_stock_batch': (SQL_ARCHIVE_STOCK_BATCH, ('NOW', 5000), ()),
+        'balance': (balance_manager.SQL_BALANCE, ('GROWID',), ()),
+        'ledger_debit': (balance_manager.SQL_DEBIT, (-1, 'GROWID', -1), ()),
+        'ledger_credit': (balance_manager.SQL_CREDIT, ('GROWID', 1), ()),
+        'ledger_insert': (balance_manager.SQL_LEDGER_INSERT, ('GROWID', 1, 1, 'KIND', None), ()),
+        'ledger_by_growid': (balance_manager.SQL_LEDGER, ('GROWID', 10), ()),
+        'catalog_all': (catalog.SQL_PRODUCTS, (), ('products',)),  # reload memuat seluruh katalog
+        'catalog_product': (catalog.SQL_PRODUCT, ('CODE',), ()),
+        'import_product_exists': (stock_import.SQL_PRODUCT_EXISTS, ('CODE',), ()),
+        'import_add_stock': (stock_import.SQL_ADD_PRODUCT_STOCK, (1, 'CODE'), ()),
+    }
+    row = ('CODE', 'CONTENT', 'USER', 'FILE', b'HASH')
+    for (global_scope, check_archive), sql in stock_import.INSERT_SQL.items():
+        params = row
+        if global_scope:
+            params += (b'HASH',)
+        if check_archive:
+            params += (b'HASH',) if global_scope else (b'HASH', 'CODE')
+        name = 'import_insert' + ('_global' if global_scope else '') + ('_archive' if check_archive else '')
+        queries[name] = (sql, params, ())
+    return queries
+
+def content_hash(content):
+    """Hash 16 byte dari isi item stock, dipakai untuk deteksi duplikat."""
+    if content is None:
+        return None
+    return hashlib.blake2b(content.encode('utf-8'), digest_size=16).digest()
+
+class InsufficientStock(Exception):
+    def __init__(self, message="Not enough stock available."):
+        super().__init__(message)
+
+class ProductUnavailable(InsufficientStock):
+    def __init__(self, product_code):
+        super().__init__(f"Product {product_code} is no longer available.")
+        self.product_code = product_code
+
+class InsufficientBalance(Exception):
+    def __init__(self, message="Insufficient balance."):
+        super().__init__(message)
+
+def configure_connection(conn):
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
 
 def get_connection():
     try:
         conn = sqlite3.connect(DATABASE)
-        return conn
+        return configure_connection(conn)
     except sqlite3.Error as e:
         print(f"Error connecting to database: {e}")
         return None
 
-def add_balance(growid, wl, dl, bgl):
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE users SET balance_wl = balance_wl + ?, balance_dl = balance_dl + ?, balance_bgl = balance_bgl + ? WHERE growid = ?", (wl, dl, bgl, growid))
-        conn.commit()
-        conn.close()
-    except sqlite3.Error as e:
-        print(f"Error updating balance: {e}")
+class Database:
+    """
+    Pool koneksi SQLite yang berjalan di worker thread.
 
-def subtract_balance(growid, wl, dl, bgl):
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE users SET balance_wl = balance_wl - ?, balance_dl = balance_dl - ?, balance_bgl = balance_bgl - ? WHERE growid = ?", (wl, dl, bgl, growid))
-        conn.commit()
-        conn.close()
-    except sqlite3.Error as e:
-        print(f"Error updating balance: {e}")
+    Setiap worker thread memiliki koneksi sendiri. Query baca dijalankan di
+    beberapa reader thread, sedangkan semua penulisan diserialkan lewat satu
+    writer thread sehingga event loop discord.py tidak pernah menunggu disk.
+    """
 
-def get_balance(growid):
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT balance_wl, balance_dl, balance_bgl FROM users WHERE growid = ?", (growid,))
-        balance = cursor.fetchone()
-        conn.close()
-        return balance
-    except sqlite3.Error as e:
-        print(f"Error getting balance: {e}")
-        return None
+    def __init__(self, path=DATABASE, readers=READER_THREADS):
+        self.path = path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = []
+        self._reader = ThreadPoolExecutor(max_workers=readers, thread_name_prefix='db-read')
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-write')
 
-# Inisialisasi database dan tabel jika belum ada
-def init_db():
-    conn = get_connection()
-    if conn is None:
-        print("Failed to initialize database connection.")
-        return
-    cursor = conn.cursor()
-    
-    # Buat tabel users
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS users (
-        growid TEXT PRIMARY KEY,
-        balance_wl INTEGER DEFAULT 0,
-        balance_dl INTEGER DEFAULT 0,
-        balance_bgl INTEGER DEFAULT 0
-    )
-    ''')
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # isolation_level=None: transaksi diatur manual di _run_write
+            conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            configure_connection(conn)
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
 
-    # Buat tabel products
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS products (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        name TEXT NOT NULL,
-        code TEXT NOT NULL UNIQUE,
-        price INTEGER NOT NULL,
-        stock INTEGER DEFAULT 0,
-        description TEXT
-    )
-    ''')
+    def _run_read(self, fn, args):
+        return fn(self._connection(), *args)
 
-    # Buat tabel user_products
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS user_products (
-        user_id INTEGER,
-        product TEXT,
-        count INTEGER,
-        PRIMARY KEY (user_id, product)
-    )
-    ''')
+    def _run_write(self, fn, args, durable):
+        conn = self._connection()
+        if durable:
+            # synchronous=NORMAL di WAL bisa kehilangan commit terakhir saat
+            # listrik mati; FULL melakukan fsync pada setiap commit
+            conn.execute("PRAGMA synchronous = FULL")
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(conn, *args)
+                conn.execute("COMMIT")
+            except BaseException:
+                # Juga saat COMMIT gagal (disk penuh, I/O error): koneksi writer
+                # tidak boleh tertinggal di dalam transaksi
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+        finally:
+            if durable:
+                conn.execute("PRAGMA synchronous = NORMAL")
+        return result
 
-    # Buat tabel world_info
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS world_info (
-        id INTEGER PRIMARY KEY,
-        world TEXT,
-        owner TEXT,
-        bot TEXT
-    )
-    ''')
+    async def read(self, fn, *args):
+        """Jalankan fn(conn, *args) di reader thread."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._reader, self._run_read, fn, args)
 
-    # Buat tabel user_growid
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS user_growid (
-        user_id INTEGER PRIMARY KEY,
-        growid TEXT
-    )
-    ''')
+    async def write(self, fn, *args, durable=False):
+        """
+        Jalankan fn(conn, *args) dalam satu transaksi di writer thread.
+        durable=True menunggu fsync sebelum kembali.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer, self._run_write, fn, args, durable)
 
-    # Buat tabel purchases dengan struktur baru
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS purchases (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        order_number INTEGER NOT NULL,
-        user_id INTEGER NOT NULL,
-        product TEXT NOT NULL,
-        quantity INTEGER NOT NULL,
-        total_price INTEGER NOT NULL,
-        purchase_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        buyer_growid TEXT,
-        buyer_name TEXT,
-        UNIQUE(order_number)
-    )
-    ''')
+    async def fetchone(self, sql, params=()):
+        return await self.read(lambda conn: conn.execute(sql, params).fetchone())
 
-    # Buat tabel product_stock
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS product_stock (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        product_code TEXT,
-        content TEXT,
-        used INTEGER DEFAULT 0,
-        used_by TEXT DEFAULT NULL,
-        used_at TIMESTAMP DEFAULT NULL,
-        added_by TEXT,
-        added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-        source_file TEXT,
-        FOREIGN KEY (product_code) REFERENCES products (code)
-    )
-    ''')
+    async def fetchall(self, sql, params=()):
+        return await self.read(lambda conn: conn.execute(sql, params).fetchall())
 
-    conn.commit()
-    conn.close()
+    async def execute(self, sql, params=()):
+        """Jalankan satu statement tulis dan kembalikan jumlah baris yang berubah."""
+        return await self.write(lambda conn: conn.execute(sql, params).rowcount)
+
+    def close(self):
+        self._reader.shutdown(wait=True)
+        self._writer.shutdown(wait=True)
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+db = Database()
+
+def claim_stock(conn, product_code, count, used_by, used_at):
+    """
+    Tandai `count` item sebagai terpakai dan kembalikan [(id, content), ...].
+    Harus dipanggil di dalam transaksi (Database.write); raise InsufficientStock
+    agar transaksi di-rollback bila stock kurang.
+    """
+    if count < 1:
+        # LIMIT negatif berarti tanpa batas di SQLite: semua item akan terklaim
+        raise ValueError(f"Invalid stock count: {count}")
+    # Produk yang sudah dihapus masih punya item used = 0 sampai
+    # ext/maintenance.py selesai menghapusnya; item itu tidak boleh terjual
+    cursor = conn.execute(SQL_TAKE_PRODUCT_STOCK, (count, product_code))
+    if cursor.rowcount == 0:
+        raise ProductUnavailable(product_code)
+    items = conn.execute(SQL_CLAIM_ITEMS, (used_by, used_at, product_code, count)).fetchall()
+    if len(items) < count:
+        raise InsufficientStock()
+    # RETURNING tidak menjamin urutan
+    items.sort()
+    return items
+
+def next_order_number(conn):
+    """
+    Ambil nomor order berikutnya. Dipanggil di dalam transaksi pembelian,
+    jadi nomor ikut di-rollback bila pembelian gagal dan tidak ada celah.
+    """
+    return conn.execute(SQL_NEXT_ORDER_NUMBER).fetchone()[0]
+
+# Saldo hanya diubah lewat ledger di ext/balance_manager.py
+
+async def get_growid(user_id):
+    async def load():
+        row = await db.fetchone(SQL_GROWID_BY_USER, (user_id,))
+        return row[0] if row else None
+    return await growids.get(user_id, load)
+
+async def set_growid(user_id, growid):
+    def _set(conn):
+        conn.execute("INSERT OR REPLACE INTO user_growid (user_id, growid) VALUES (?, ?)", (user_id, growid))
+        conn.execute("INSERT OR IGNORE INTO users (growid) VALUES (?)", (growid,))
+    await db.write(_set)
+    growids.invalidate(user_id)
+    # Baris users baru berarti saldo 0, bukan lagi "tidak terdaftar"
+    balances.invalidate(growid)
+
+async def get_world_info():
+    return await db.fetchone("SELECT world, owner, bot FROM world_info WHERE id = 1")
+
+async def get_state(key, default=None):
+    row = await db.fetchone("SELECT value FROM bot_state WHERE key = ?", (key,))
+    return row[0] if row else default
+
+async def set_state(key, value):
+    await db.execute("INSERT OR REPLACE INTO bot_state (key, value) VALUES (?, ?)", (key, value))
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def migrate(conn):
+    """Jalankan migrasi yang belum diterapkan, masing-masing dalam transaksinya sendiri."""
+    conn.isolation_level = None
+    current = schema_version(conn)
+    for version, migration in MIGRATIONS:
+        if version <= current:
+            continue
+        logging.info(f"Applying migration {version}: {migration.__name__}")
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        current = version
+    return current
+
+def check_query_plans(conn, queries=None):
+    """
+    Kembalikan daftar (nama, detail) untuk setiap query panas yang rencana
+    eksekusinya melakukan full table scan di luar tabel yang diizinkan.
+    """
+    if queries is None:
+        queries = hot_queries()
+    regressions = []
+    for name, (sql, params, allowed_scans) in queries.items():
+        for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params):
+            detail = row[3]
+            # "SCAN CONSTANT ROW" adalah SELECT tanpa FROM (INSERT ... SELECT ?, ...)
+            if not detail.startswith('SCAN ') or detail == 'SCAN CONSTANT ROW':
+                continue
+            table = detail.split()[1]
+            # "SCAN ps USING COVERING INDEX ..." tetap dihitung sebagai scan penuh
+            if table not in allowed_scans:
+                regressions.append((name, detail))
+    return regressions
+
+# Inisialisasi database dan jalankan migrasi skema
+def init_db():
+    conn = get_connection()
+    if conn is None:
+        print("Failed to initialize database connection.")
+        return
+    try:
+        migrate(conn)
+        for name, detail in check_query_plans(conn):
+            logging.warning(f"Query plan regression in {name}: {detail}")
+    finally:
+        conn.close()
 
 # Fungsi untuk menghapus dan membuat ulang tabel purchases jika diperlukan
 def reset_purchases_table():
@@ -142,10 +373,10 @@ def reset_purchases_table():
         print("Failed to initialize database connection.")
         return
     cursor = conn.cursor()
-    
+
     # Hapus tabel lama
     cursor.execute('DROP TABLE IF EXISTS purchases')
-    
+
     # Buat tabel baru dengan struktur yang benar
     cursor.execute('''
     CREATE TABLE purchases (
@@ -158,14 +389,26 @@ def reset_purchases_table():
         purchase_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         buyer_growid TEXT,
         buyer_name TEXT,
-        UNIQUE(order_number)
+        UNIQUE(order_number, product)
     )
     ''')
-    
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_purchases_user ON purchases (user_id)')
+
     conn.commit()
     conn.close()
 
 if __name__ == "__main__":
+    if '--check-plans' in sys.argv:
+        # Periksa rencana query pada skema hasil migrasi di database kosong
+        conn = configure_connection(sqlite3.connect(':memory:'))
+        migrate(conn)
+        queries = hot_queries()
+        regressions = check_query_plans(conn, queries)
+        for name, detail in regressions:
+            print(f"{name}: {detail}")
+        print(f"{len(queries) - len({name for name, _ in regressions})}/{len(queries)} hot queries use indexes")
+        sys.exit(1 if regressions else 0)
+
     init_db()
     # Uncomment baris berikut jika ingin mereset tabel purchases
-    # reset_purchases_table()
\ No newline at end of file
+    # reset_purchases_table()
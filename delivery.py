@@ -0,0 +1,134 @@
+"""
+File hasil order (daftar item yang dibeli) dibuat di memori.
+
+Isi file dirender sekali sebagai bytes lalu dipakai bersama untuk channel log
+dan DM pembeli; setiap pengiriman membungkusnya dengan BytesIO baru, jadi
+tidak ada file sementara di disk. Order yang sangat besar dibagi menjadi
+beberapa lampiran tanpa memotong baris; batas upload Discord berlaku untuk
+total lampiran per pesan, jadi part sebesar itu dikirim satu per pesan.
+
+Untuk DM berisi daftar item, dm_sends() mengemas baris utuh ke pesan
+sepanjang maksimal 2000 karakter, atau beralih ke satu lampiran bila
+daftarnya terlalu panjang untuk beberapa pesan.
+"""
+import io
+import discord
+
+MAX_ATTACHMENT_BYTES = 8 * 1024 * 1024  # batas upload Discord tanpa boost
+MAX_MESSAGE_BYTES = MAX_ATTACHMENT_BYTES  # batas berlaku untuk total lampiran per pesan
+MAX_FILES_PER_MESSAGE = 10
+MESSAGE_LIMIT = 2000
+DM_MAX_MESSAGES = 3  # lebih dari ini, daftar item dikirim sebagai lampiran
+
+def receipt_lines(user_name, order_count, formatted_time, total_price, delivered):
+    """delivered = [(kode, jumlah, subtotal, [(id, content), ...])]"""
+    yield f"Current Date and Time (UTC - YYYY-MM-DD HH:MM:SS formatted): {formatted_time}\n"
+    yield f"Current User's Login: {user_name}\n"
+    yield "\n"
+    yield f"Order #{order_count}\n"
+    yield f"Total Price: {total_price} WL\n"
+    for product_code, quantity, subtotal, items in delivered:
+        yield "\n"
+        yield f"Product: {product_code}\n"
+        yield f"Quantity: {quantity}\n"
+        yield f"Price: {subtotal} WL\n"
+        yield "Items:\n"
+        for i, (_, content) in enumerate(items, 1):
+            yield f"{i}. {content}\n"
+
+def pack_parts(lines, limit=MAX_ATTACHMENT_BYTES):
+    """Tulis baris ke buffer dan mulai buffer baru sebelum melewati `limit` byte."""
+    parts = []
+    buffer = io.BytesIO()
+    for line in lines:
+        data = line.encode('utf-8')
+        if buffer.tell() and buffer.tell() + len(data) > limit:
+            parts.append(buffer.getvalue())
+            buffer = io.BytesIO()
+        buffer.write(data)
+    if buffer.tell() or not parts:
+        parts.append(buffer.getvalue())
+    return parts
+
+def pack_messages(lines, limit=MESSAGE_LIMIT):
+    """Gabungkan baris utuh menjadi pesan sepanjang maksimal `limit` karakter."""
+    messages = []
+    current = []
+    size = 0
+    for line in lines:
+        line = line[:limit]
+        if current and size + 1 + len(line) > limit:
+            messages.append("\n".join(current))
+            current = []
+            size = 0
+        size += len(line) + (1 if current else 0)
+        current.append(line)
+    if current:
+        messages.append("\n".join(current))
+    return messages
+
+def group_parts(parts, limit=MAX_MESSAGE_BYTES, max_files=MAX_FILES_PER_MESSAGE):
+    """Kelompokkan indeks part per pesan sehingga total byte lampiran tidak melewati `limit`."""
+    groups = []
+    size = 0
+    for index, part in enumerate(parts):
+        if groups and len(groups[-1]) < max_files and size + len(part) <= limit:
+            groups[-1].append(index)
+            size += len(part)
+        else:
+            groups.append([index])
+            size = len(part)
+    return groups
+
+class Receipt:
+    def __init__(self, name, parts):
+        self.name = name
+        self.parts = parts
+        self.groups = group_parts(parts)
+
+    def filenames(self):
+        if len(self.parts) == 1:
+            return [f"{self.name}.txt"]
+        return [f"{self.name} (part {index}).txt" for index in range(1, len(self.parts) + 1)]
+
+    def message_count(self):
+        return len(self.groups)
+
+    async def send_message(self, destination, index, content=None):
+        """
+        Kirim lampiran untuk pesan ke-`index`. Lampiran dibuat baru setiap
+        panggilan sehingga aman dipanggil ulang saat retry.
+        """
+        names = self.filenames()
+        files = [discord.File(io.BytesIO(self.parts[i]), filename=names[i]) for i in self.groups[index]]
+        await destination.send(content=content, files=files)
+
+    async def send(self, destination, content=None):
+        for index in range(self.message_count()):
+            await self.send_message(destination, index, content if index == 0 else None)
+
+def build_receipt(user_name, order_count, formatted_time, total_price, delivered):
+    lines = receipt_lines(user_name, order_count, formatted_time, total_price, delivered)
+    return Receipt(f"result (order {order_count})", pack_parts(lines))
+
+def dm_sends(destination, header, lines, name, limit=MESSAGE_LIMIT, max_messages=DM_MAX_MESSAGES):
+    """
+    Kembalikan daftar coroutine function tanpa argumen, masing-masing satu
+    panggilan API, untuk mengirim `header` dan `lines` ke `destination`.
+    Baris tidak pernah dipotong: bila tidak muat dalam `max_messages` pesan
+    (atau ada baris yang lebih panjang dari satu pesan) isinya dikirim
+    sebagai lampiran.
+    """
+    lines = list(lines)
+    total = len(header) + sum(len(line) + 1 for line in lines)
+    fits = total <= limit * max_messages and all(len(line) <= limit for line in lines)
+    if fits:
+        messages = pack_messages([header, ""] + lines, limit)
+        if len(messages) <= max_messages:
+            return [lambda content=content: destination.send(content) for content in messages]
+
+    receipt = Receipt(name, pack_parts(f"{line}\n" for line in lines))
+    return [
+        lambda index=index: receipt.send_message(destination, index, header if index == 0 else None)
+        for index in range(receipt.message_count())
+    ]
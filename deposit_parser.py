@@ -0,0 +1,98 @@
+"""
+Parser string Deposit dari game bot, misalnya "5 World Lock, 2 Diamond Locks, 1 BGL".
+
+Seluruh string diproses dengan satu regex terkompilasi. Setiap fragmen (dipisah
+koma) berupa jumlah diikuti nama lock; bentuk jamak dan singkatan (WL, DL, BGL)
+dikenali. Jumlah boleh memakai pemisah ribuan ("1,000 World Lock"); angka
+tanpa nama lock bukan fragmen yang valid, jadi koma di antara kelompok tiga
+digit tidak pernah dibaca sebagai pemisah fragmen. Lock yang tidak dikenal
+dan fragmen yang tidak valid tidak membuat parsing gagal, tetapi dilaporkan
+di hasil. Sifat parser dan biayanya diuji di tests/test_deposit_parser.py.
+"""
+import re
+
+# Nilai setiap lock dalam World Lock
+LOCK_VALUES = {
+    'world lock': 1,
+    'diamond lock': 100,
+    'blue gem lock': 10000,
+}
+
+ALIASES = {
+    'wl': 'world lock',
+    'dl': 'diamond lock',
+    'bgl': 'blue gem lock',
+}
+
+MAX_QUANTITY = 10 ** 9
+
+_FRAGMENT = re.compile(r"""
+    \s*
+    (?:
+        (?P<qty>\d{1,3}(?:,\d{3})+(?!\d)|\d+) \s* (?:x\s*)? (?P<name>[A-Za-z](?:[A-Za-z ]*[A-Za-z])?)
+      | (?P<bad>[^,]*?)
+    )
+    \s* (?:,|$)
+""", re.VERBOSE)
+
+_SPACES = re.compile(r"\s+")
+
+class DepositParse:
+    def __init__(self):
+        self.counts = dict.fromkeys(LOCK_VALUES, 0)
+        self.unknown = {}   # nama lock tidak dikenal -> jumlah
+        self.rejected = []  # fragmen yang tidak bisa dibaca
+
+    @property
+    def wl(self):
+        return self.counts['world lock']
+
+    @property
+    def dl(self):
+        return self.counts['diamond lock']
+
+    @property
+    def bgl(self):
+        return self.counts['blue gem lock']
+
+    @property
+    def total_wl(self):
+        return sum(count * LOCK_VALUES[name] for name, count in self.counts.items())
+
+    @property
+    def clean(self):
+        return not self.unknown and not self.rejected
+
+    def __repr__(self):
+        return (f"DepositParse(counts={self.counts}, unknown={self.unknown}, "
+                f"rejected={self.rejected}, total_wl={self.total_wl})")
+
+def normalize_lock_name(name):
+    name = _SPACES.sub(' ', name.strip().lower())
+    name = ALIASES.get(name, name)
+    if name not in LOCK_VALUES and name.endswith('s'):
+        singular = ALIASES.get(name[:-1], name[:-1])
+        if singular in LOCK_VALUES:
+            return singular
+    return name
+
+def parse_deposit(deposit):
+    result = DepositParse()
+    for match in _FRAGMENT.finditer(deposit):
+        bad = match.group('bad')
+        if bad is not None:
+            if bad:
+                result.rejected.append(bad)
+            continue
+
+        quantity = int(match.group('qty').replace(',', ''))
+        if quantity > MAX_QUANTITY:
+            result.rejected.append(match.group(0).strip(' \t\r\n,'))
+            continue
+
+        name = normalize_lock_name(match.group('name'))
+        if name in LOCK_VALUES:
+            result.counts[name] += quantity
+        else:
+            result.unknown[name] = result.unknown.get(name, 0) + quantity
+    return result
@@ -0,0 +1,80 @@
+"""
+Antrian event toko (donasi, order) yang aman dipakai dari thread mana pun.
+
+Penerbit cukup memanggil events.publish(...) tanpa pernah menunggu Discord;
+cog ext/feed.py mengambil event per batch di event loop bot dan mengirimnya
+ke channel log.
+"""
+import asyncio
+import logging
+import queue
+from datetime import datetime, timezone
+
+MAX_PENDING = 10000  # event lama dibuang bila konsumen tertinggal sejauh ini
+
+class EventQueue:
+    def __init__(self, max_pending=MAX_PENDING):
+        self._items = queue.SimpleQueue()
+        self._max_pending = max_pending
+        self._loop = None
+        self._wakeup = None
+        self.dropped = 0
+
+    def bind(self, loop):
+        """Dipanggil oleh konsumen di event loop yang akan menerima event."""
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+
+    def publish(self, kind, **data):
+        if self._items.qsize() >= self._max_pending:
+            try:
+                self._items.get_nowait()
+                self.dropped += 1
+            except queue.Empty:
+                pass
+        self._items.put({'kind': kind, 'time': datetime.now(timezone.utc), **data})
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self._wakeup.set)
+
+    def _drain(self, limit, batch):
+        while len(batch) < limit:
+            try:
+                batch.append(self._items.get_nowait())
+            except queue.Empty:
+                break
+
+    async def get_batch(self, max_items, max_wait):
+        """
+        Tunggu event pertama, lalu kumpulkan event berikutnya sampai
+        max_items event atau max_wait detik, mana yang lebih dulu.
+        """
+        if self._wakeup is None:
+            self.bind(asyncio.get_running_loop())
+        loop = asyncio.get_running_loop()
+        batch = []
+        deadline = None
+        while len(batch) < max_items:
+            # clear sebelum drain supaya publish di antaranya tidak terlewat
+            self._wakeup.clear()
+            self._drain(max_items, batch)
+            if len(batch) >= max_items:
+                break
+            if batch and deadline is None:
+                deadline = loop.time() + max_wait
+            if deadline is None:
+                await self._wakeup.wait()
+                continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+        if self.dropped:
+            logging.warning(f"Event feed fell behind; {self.dropped} events dropped")
+            self.dropped = 0
+        return batch
+
+events = EventQueue()
@@ -1,104 +1,116 @@
-from database import get_connection
+"""
+Ledger saldo.
 
-# Fungsi untuk menambahkan saldo
-def add_balance(growid, wl=0, dl=0, bgl=0):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-    INSERT INTO users (growid, balance_wl, balance_dl, balance_bgl)
-    VALUES (?, ?, ?, ?)
-    ON CONFLICT(growid) DO UPDATE SET
-    balance_wl = balance_wl + ?,
-    balance_dl = balance_dl + ?,
-    balance_bgl = balance_bgl + ?
-    ''', (growid, wl, dl, bgl, wl, dl, bgl))
-    conn.commit()
-    conn.close()
-
-# Fungsi untuk mengurangi saldo
-def subtract_balance(growid, wl=0, dl=0, bgl=0):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-    UPDATE users
-    SET balance_wl = balance_wl - ?,
-        balance_dl = balance_dl - ?,
-        balance_bgl = balance_bgl - ?
-    WHERE growid = ?
-    ''', (wl, dl, bgl, growid))
-    conn.commit()
-    conn.close()
-
-# Fungsi untuk mendapatkan saldo
-def get_balance(growid):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-    SELECT balance_wl, balance_dl, balance_bgl
-    FROM users
+Setiap perpindahan uang (donasi, pembelian, kredit/debit admin) dicatat
+sebagai satu baris append-only di tabel ledger dalam satuan dasar World Lock.
+Saldo di users.balance_wl adalah hasil materialisasi ledger dan selalu
+diperbarui di transaksi yang sama dengan entrinya. DL dan BGL hanya dipakai
+untuk input dan tampilan.
+"""
+import asyncio
+from cache import balances
+from database import db, InsufficientBalance
+
+WL_PER_DL = 100
+WL_PER_BGL = 10000
+
+def to_wl(wl=0, dl=0, bgl=0):
+    return wl + dl * WL_PER_DL + bgl * WL_PER_BGL
+
+def split_wl(total_wl):
+    """Pecah saldo WL menjadi (wl, dl, bgl) untuk ditampilkan."""
+    bgl, rest = divmod(total_wl, WL_PER_BGL)
+    dl, wl = divmod(rest, WL_PER_DL)
+    return wl, dl, bgl
+
+SQL_DEBIT = """
+    UPDATE users SET balance_wl = balance_wl + ?
+    WHERE growid = ? AND balance_wl + ? >= 0
+    RETURNING balance_wl
+"""
+
+SQL_CREDIT = """
+    INSERT INTO users (growid, balance_wl) VALUES (?, ?)
+    ON CONFLICT(growid) DO UPDATE SET balance_wl = balance_wl + excluded.balance_wl
+    RETURNING balance_wl
+"""
+
+SQL_LEDGER_INSERT = """
+    INSERT INTO ledger (growid, delta_wl, balance_after, kind, ref)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+SQL_BALANCE = "SELECT balance_wl FROM users WHERE growid = ?"
+
+SQL_LEDGER = """
+    SELECT id, delta_wl, balance_after, kind, ref, created_at
+    FROM ledger
     WHERE growid = ?
-    ''', (growid,))
-    balance = cursor.fetchone()
-    conn.close()
-    return balance
-
-# Fungsi konversi saldo
-def convert_balance(growid, from_currency, to_currency, amount):
-    balance = get_balance(growid)
-    if not balance:
-        return "User not found"
-    
-    balance_wl, balance_dl, balance_bgl = balance
-
-    if from_currency == 'WL' and to_currency == 'DL':
-        if balance_wl >= amount:
-            subtract_balance(growid, wl=amount)
-            add_balance(growid, dl=amount // 100)
-        else:
-            return "Insufficient WL balance"
-    elif from_currency == 'DL' and to_currency == 'WL':
-        if balance_dl >= amount:
-            subtract_balance(growid, dl=amount)
-            add_balance(growid, wl=amount * 100)
-        else:
-            return "Insufficient DL balance"
-    elif from_currency == 'DL' and to_currency == 'BGL':
-        if balance_dl >= amount:
-            subtract_balance(growid, dl=amount)
-            add_balance(growid, bgl=amount // 100)
-        else:
-            return "Insufficient DL balance"
-    elif from_currency == 'BGL' and to_currency == 'DL':
-        if balance_bgl >= amount:
-            subtract_balance(growid, bgl=amount)
-            add_balance(growid, dl=amount * 100)
-        else:
-            return "Insufficient BGL balance"
+    ORDER BY id DESC
+    LIMIT ?
+"""
+
+def post_entry(conn, growid, delta_wl, kind, ref=None):
+    """
+    Catat satu entri ledger dan perbarui saldo materialized. Harus dipanggil
+    di dalam transaksi (Database.write). Debit yang membuat saldo negatif
+    raise InsufficientBalance sehingga transaksi di-rollback. Kembalikan saldo baru.
+    Setelah commit, pemanggil harus menjalankan balances.invalidate(growid).
+    """
+    if delta_wl < 0:
+        row = conn.execute(SQL_DEBIT, (delta_wl, growid, delta_wl)).fetchone()
+        if row is None:
+            raise InsufficientBalance()
     else:
-        return "Invalid conversion"
+        row = conn.execute(SQL_CREDIT, (growid, delta_wl)).fetchone()
+
+    conn.execute(SQL_LEDGER_INSERT, (growid, delta_wl, row[0], kind, ref))
+    return row[0]
+
+def credit(conn, growid, amount_wl, kind, ref=None):
+    return post_entry(conn, growid, amount_wl, kind, ref)
+
+def debit(conn, growid, amount_wl, kind, ref=None):
+    return post_entry(conn, growid, -amount_wl, kind, ref)
+
+# Fungsi untuk menambahkan saldo
+async def add_balance(growid, wl=0, dl=0, bgl=0, kind='admin_credit', ref=None):
+    try:
+        return await db.write(credit, growid, to_wl(wl, dl, bgl), kind, ref)
+    finally:
+        balances.invalidate(growid)
+
+# Fungsi untuk mengurangi saldo; raise InsufficientBalance bila saldo kurang
+async def subtract_balance(growid, wl=0, dl=0, bgl=0, kind='admin_debit', ref=None):
+    try:
+        return await db.write(debit, growid, to_wl(wl, dl, bgl), kind, ref)
+    finally:
+        balances.invalidate(growid)
 
-    return "Conversion successful"
+# Fungsi untuk mendapatkan saldo (dalam WL), None bila GrowID belum terdaftar
+async def get_balance(growid):
+    async def load():
+        row = await db.fetchone(SQL_BALANCE, (growid,))
+        return row[0] if row else None
+    return await balances.get(growid, load)
 
-# Fungsi untuk mendapatkan saldo WL dengan konversi dari DL dan BGL
-def get_total_wl_balance(growid):
-    balance = get_balance(growid)
-    if not balance:
-        return "User not found"
-    
-    balance_wl, balance_dl, balance_bgl = balance
-    total_wl = balance_wl + (balance_dl * 100) + (balance_bgl * 10000)
-    return total_wl
+async def get_ledger(growid, limit=10):
+    return await db.fetchall(SQL_LEDGER, (growid, limit))
+
+async def _demo():
+    growid = "user123"
+    await add_balance(growid, wl=150, dl=2, bgl=1)
+    print(split_wl(await get_balance(growid)))
+    await subtract_balance(growid, dl=1)
+    print(split_wl(await get_balance(growid)))
+    try:
+        await subtract_balance(growid, bgl=5)
+    except InsufficientBalance as e:
+        print(e)
+    for entry in await get_ledger(growid):
+        print(entry)
 
 if __name__ == "__main__":
     from database import init_db
     init_db()
-    growid = "user123"
-    add_balance(growid, wl=150, dl=2, bgl=1)
-    print(get_balance(growid))
-    print(convert_balance(growid, 'WL', 'DL', 100))
-    print(get_balance(growid))
-    print(convert_balance(growid, 'DL', 'BGL', 1))
-    print(get_balance(growid))
-    print(convert_balance(growid, 'BGL', 'DL', 1))
-    print(get_balance(growid))
-    print(f"Total WL balance for {growid} (including DL and BGL converted to WL): {get_total_wl_balance(growid)}")
\ No newline at end of file
+    asyncio.run(_demo())
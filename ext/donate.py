@@ -1,10 +1,15 @@
-import sqlite3
+import asyncio
+import datetime
+import hashlib
 import json
 import logging
-from http.server import BaseHTTPRequestHandler, HTTPServer
+from aiohttp import web
 from discord.ext import commands
-from ext.balance_manager import add_balance
-from database import get_connection
+from cache import balances
+from database import db, SQL_RECENT_DONATION
+from deposit_parser import parse_deposit
+from events import events
+from ext.balance_manager import credit
 
 # Baca konfigurasi dari config.json
 with open('config.json') as config_file:
@@ -12,88 +17,257 @@ with open('config.json') as config_file:
 
 DATABASE = 'store.db'
 PORT = 8081  # Ganti port jika diperlukan untuk menghindari bentrok
+MAX_BODY_SIZE = 64 * 1024  # byte; payload donasi jauh lebih kecil
+KEEPALIVE_TIMEOUT = 75  # detik koneksi idle dari game bot tetap dibuka
 DONATION_LOG_CHANNEL_ID = config['id_donation_log']
+GROUP_COMMIT_WINDOW = 0.05  # detik donasi dikumpulkan sebelum commit
+GROUP_COMMIT_MAX = 500      # donasi maksimal per commit
+# Donasi tanpa deposit ID dianggap kiriman ulang hanya bila payload yang sama
+# sudah dicatat dalam jendela ini; setelahnya dianggap donasi baru
+RETRY_WINDOW = 120  # detik
 
-class DonateHandler(BaseHTTPRequestHandler):
-    def db_connect(self):
-        return get_connection()
+class InvalidDonation(ValueError):
+    pass
 
-    def do_POST(self):
-        content_length = int(self.headers['Content-Length'])
-        post_data = self.rfile.read(content_length)
-        logging.info(f"Received donation data: {post_data}")
+def deposit_key(data):
+    """
+    ID deposit dari game bot bila dikirim; selain itu hash dari seluruh payload.
+    Key hash hanya menolak kiriman ulang dalam RETRY_WINDOW (lihat record_donations).
+    """
+    for field in ('DepositID', 'deposit_id', 'id'):
+        if data.get(field) is not None:
+            return f"id:{data[field]}"
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'))
+    return 'sha256:' + hashlib.sha256(canonical.encode()).hexdigest()
 
+def parse_donation(data, occurrence=0):
+    """
+    `occurrence` membedakan payload identik di dalam satu array, supaya
+    keduanya dikredit sementara kiriman ulang array yang sama tetap ditolak.
+    """
+    if not isinstance(data, dict):
+        raise InvalidDonation("Invalid data")
+    growid = data.get('GrowID')
+    deposit = data.get('Deposit')
+    if not growid or not isinstance(growid, str) or not deposit or not isinstance(deposit, str):
+        raise InvalidDonation("Invalid data")
+    parsed = parse_deposit(deposit)
+    if parsed.total_wl <= 0:
+        raise InvalidDonation(f"Invalid deposit: {deposit}")
+    if not parsed.clean:
+        # Bagian yang dikenali tetap dikredit; sisanya dicatat untuk dicek manual
+        logging.warning(f"Deposit for {growid} has unknown locks {parsed.unknown} "
+                        f"and rejected fragments {parsed.rejected}")
+    key = deposit_key(data)
+    if key.startswith('sha256:'):
+        key += f"#{occurrence}"
+    return {
+        'key': key,
+        'growid': growid,
+        'amount_wl': parsed.total_wl,
+        'payload': json.dumps(data),
+    }
+
+def record_donations(conn, donations):
+    """
+    Catat dan kredit donasi dalam satu transaksi. Donasi dengan deposit ID
+    yang sudah pernah dicatat dilewati; donasi dengan key hash hanya dilewati
+    bila key yang sama tercatat dalam RETRY_WINDOW terakhir. Setiap donasi
+    memakai SAVEPOINT sendiri sehingga satu baris yang gagal tidak membatalkan
+    donasi lain. Kembalikan True/False (dikredit) atau exception per donasi.
+    """
+    results = []
+    for donation in donations:
+        conn.execute("SAVEPOINT donation")
         try:
-            data = json.loads(post_data)
-            growid = data.get('GrowID')
-            deposit = data.get('Deposit')
-
-            if not growid or not deposit:
-                self.send_response(400)
-                self.end_headers()
-                self.wfile.write(b"Invalid data")
-                return
-
-            wl = 0
-            dl = 0
-            bgl = 0
-
-            # Extract WL, DL, and BGL from the deposit string
-            deposits = deposit.split(',')
-            for d in deposits:
-                d = d.strip()
-                if 'World Lock' in d:
-                    wl += int(d.split()[0])
-                elif 'Diamond Lock' in d:
-                    dl += int(d.split()[0])
-                elif 'Blue Gem Lock' in d:
-                    bgl += int(d.split()[0])
-
-            total_wl = wl + (dl * 100) + (bgl * 10000)
-            add_balance(growid, wl=total_wl)
-
-            self.send_response(200)
-            self.end_headers()
-            self.wfile.write(f"Donation received. Added {total_wl} WL to {growid}'s balance.".encode())
-
-            logging.info(f"Added {total_wl} WL to {growid}'s balance.")
+            results.append(_record_donation(conn, donation))
+        except Exception as e:
+            conn.execute("ROLLBACK TO donation")
+            results.append(e)
+        conn.execute("RELEASE donation")
+    return results
+
+def _record_donation(conn, donation):
+    key = donation['key']
+    if key.startswith('sha256:'):
+        # Disimpan sebagai "<key>@<waktu>" sehingga donasi identik berikutnya
+        # di luar jendela tetap punya deposit_key unik
+        if conn.execute(SQL_RECENT_DONATION, (key + '@', key + 'A', f"-{RETRY_WINDOW} seconds")).fetchone():
+            return False
+        key += '@' + datetime.datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.%f')
+    cursor = conn.execute(
+        "INSERT OR IGNORE INTO donations (deposit_key, growid, amount_wl, payload) VALUES (?, ?, ?, ?)",
+        (key, donation['growid'], donation['amount_wl'], donation['payload'])
+    )
+    credited = cursor.rowcount == 1
+    if credited:
+        credit(conn, donation['growid'], donation['amount_wl'], 'donation', key)
+    return credited
+
+class DonationBatcher:
+    """
+    Group commit untuk donasi: donasi yang masuk dalam GROUP_COMMIT_WINDOW
+    (atau sampai GROUP_COMMIT_MAX donasi) dikredit dalam satu transaksi durable.
+    Future setiap donasi baru selesai setelah commit tersebut.
+    """
+
+    def __init__(self):
+        self._pending = []
+        self._timer = None
+        self._commits = set()
+
+    def submit(self, donation):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((donation, future))
+        if len(self._pending) >= GROUP_COMMIT_MAX:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(GROUP_COMMIT_WINDOW, self.flush)
+        return future
+
+    def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.create_task(self._commit(batch))
+        self._commits.add(task)
+        task.add_done_callback(self._commits.discard)
 
+    async def _commit(self, batch):
+        try:
+            results = await db.write(record_donations, [donation for donation, _ in batch], durable=True)
         except Exception as e:
-            logging.error(f"Error processing donation: {e}")
-            self.send_response(500)
-            self.end_headers()
-            self.wfile.write(b"Internal server error")
+            logging.error(f"Error committing {len(batch)} donations: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        balances.invalidate(*{donation['growid'] for donation, _ in batch})
+        for (donation, future), credited in zip(batch, results):
+            if isinstance(credited, Exception):
+                logging.error(f"Error recording donation for {donation['growid']}: {credited}")
+                if not future.done():
+                    future.set_exception(credited)
+                continue
+            if credited:
+                events.publish('donation', growid=donation['growid'], amount_wl=donation['amount_wl'])
+            if not future.done():
+                future.set_result(credited)
+
+    async def close(self):
+        self.flush()
+        if self._commits:
+            await asyncio.gather(*self._commits, return_exceptions=True)
+
+async def handle_donation(request):
+    post_data = await request.read()
+    logging.info(f"Received donation data: {post_data}")
+
+    try:
+        data = json.loads(post_data)
+    except ValueError:
+        return web.Response(status=400, text="Invalid data")
+
+    batcher = request.app['batcher']
+
+    # Satu donasi: balasan teks seperti sebelumnya
+    if not isinstance(data, list):
+        try:
+            donation = parse_donation(data)
+        except InvalidDonation as e:
+            return web.Response(status=400, text=str(e))
+        try:
+            credited = await batcher.submit(donation)
+        except Exception:
+            return web.Response(status=500, text="Internal server error")
+        growid, total_wl = donation['growid'], donation['amount_wl']
+        if not credited:
+            logging.info(f"Duplicate donation ignored for {growid}.")
+            return web.Response(text=f"Duplicate donation ignored for {growid}.")
+        logging.info(f"Added {total_wl} WL to {growid}'s balance.")
+        return web.Response(text=f"Donation received. Added {total_wl} WL to {growid}'s balance.")
+
+    # Array donasi: hasil per item, status 200 hanya setelah semua tercommit
+    results = []
+    futures = []
+    occurrences = {}
+    for item in data:
+        try:
+            key = deposit_key(item) if isinstance(item, dict) else None
+            occurrences[key] = occurrences.get(key, -1) + 1
+            donation = parse_donation(item, occurrences[key])
+        except InvalidDonation as e:
+            results.append({'status': 'invalid', 'error': str(e)})
+            continue
+        results.append({'GrowID': donation['growid'], 'amount_wl': donation['amount_wl']})
+        futures.append((results[-1], batcher.submit(donation)))
+
+    try:
+        for result, future in futures:
+            result['status'] = 'credited' if await future else 'duplicate'
+    except Exception:
+        return web.Response(status=500, text="Internal server error")
+
+    credited = sum(1 for result in results if result['status'] == 'credited')
+    logging.info(f"Donation batch: {credited}/{len(results)} credited.")
+    return web.json_response(results)
+
+def create_app():
+    # client_max_size menolak body yang terlalu besar dengan 413 sebelum dibaca
+    app = web.Application(client_max_size=MAX_BODY_SIZE)
+    app['batcher'] = DonationBatcher()
+    app.router.add_route('POST', '/{tail:.*}', handle_donation)
+    app.on_cleanup.append(close_batcher)
+    return app
 
-def run(server_class=HTTPServer, handler_class=DonateHandler, port=PORT):
+async def close_batcher(app):
+    await app['batcher'].close()
+
+async def start_server(port=PORT):
+    runner = web.AppRunner(create_app(), keepalive_timeout=KEEPALIVE_TIMEOUT, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '0.0.0.0', port)
+    try:
+        await site.start()
+    except OSError:
+        await runner.cleanup()
+        raise
+    logging.info(f'Starting donation server on port {port}')
+    return runner
+
+def run(port=PORT):
+    from database import init_db
     logging.basicConfig(level=logging.INFO)
-    server_address = ('', port)
-    httpd = server_class(server_address, handler_class)
-    logging.info(f'Starting server on port {port}...')
-    httpd.serve_forever()
+    init_db()
+    web.run_app(create_app(), port=port, keepalive_timeout=KEEPALIVE_TIMEOUT)
 
 class DonateCog(commands.Cog):
+    """
+    Server webhook donasi. Berjalan di event loop bot dan hidup selama cog
+    ter-load; reconnect gateway tidak mempengaruhinya.
+    """
+
     def __init__(self, bot):
         self.bot = bot
-        self.server = None
-
-    @commands.Cog.listener()
-    async def on_ready(self):
-        if self.server is None:
-            try:
-                self.server = HTTPServer(('0.0.0.0', PORT), DonateHandler)
-                logging.info(f'Starting donation server on port {PORT}')
-                self.bot.loop.run_in_executor(None, self.server.serve_forever)
-            except OSError as e:
-                logging.error(f"Error starting HTTP server: {e}")
-
-    @commands.Cog.listener()
-    async def on_disconnect(self):
-        if self.server:
-            self.server.shutdown()
-            self.server = None
+        self.runner = None
+
+    async def cog_load(self):
+        try:
+            self.runner = await start_server()
+        except OSError as e:
+            logging.error(f"Error starting HTTP server: {e}")
+
+    async def cog_unload(self):
+        if self.runner:
+            await self.runner.cleanup()
+            self.runner = None
 
 async def setup(bot):
     await bot.add_cog(DonateCog(bot))
 
 if __name__ == "__main__":
-    run()
\ No newline at end of file
+    run()
@@ -0,0 +1,54 @@
+import asyncio
+import json
+import logging
+from discord.ext import commands
+from delivery import pack_messages
+from events import events
+from outbound import outbound, channel_route, PRIORITY_LOG
+
+# Baca konfigurasi dari config.json
+with open('config.json') as config_file:
+    config = json.load(config_file)
+
+DONATION_LOG_CHANNEL_ID = int(config['id_donation_log'])
+FEED_BATCH_SIZE = 20    # event maksimal per pesan
+FEED_BATCH_WINDOW = 5   # detik menunggu event lain sebelum pesan dikirim
+
+def format_event(event):
+    time = event['time'].strftime('%H:%M:%S')
+    if event['kind'] == 'donation':
+        return f"`{time}` 💰 **{event['growid']}** deposited **{event['amount_wl']:,} WL**"
+    if event['kind'] == 'order':
+        return (f"`{time}` 🛒 Order #{event['order_number']}: **{event['growid']}** bought "
+                f"**{event['quantity']}x {event['product_code']}** for **{event['total_price']:,} WL**")
+    return f"`{time}` {event['kind']}: {event}"
+
+class EventFeed(commands.Cog):
+    """Kirim event donasi dan order ke channel log donasi, satu pesan per batch."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.task = None
+
+    async def cog_load(self):
+        events.bind(asyncio.get_running_loop())
+        self.task = asyncio.create_task(self.run())
+
+    async def cog_unload(self):
+        if self.task:
+            self.task.cancel()
+
+    async def run(self):
+        await self.bot.wait_until_ready()
+        while True:
+            batch = await events.get_batch(FEED_BATCH_SIZE, FEED_BATCH_WINDOW)
+            channel = self.bot.get_channel(DONATION_LOG_CHANNEL_ID)
+            if not channel:
+                logging.error('Donation log channel not found')
+                continue
+            for content in pack_messages(format_event(event) for event in batch):
+                outbound.enqueue(channel_route(channel), lambda content=content: channel.send(content),
+                                 PRIORITY_LOG, 'event feed')
+
+async def setup(bot):
+    await bot.add_cog(EventFeed(bot))
@@ -1,16 +1,90 @@
 import discord
 from discord.ext import commands, tasks
-from discord.ui import Button, Modal, TextInput
+from discord.ui import Modal, TextInput
+import asyncio
+import hashlib
 import logging
 from datetime import datetime
-from database import get_connection, get_balance
+from database import db, get_growid, set_growid, get_world_info, get_state, set_state, SQL_LIVE_STOCK
 import json
+from ext.balance_manager import get_balance, split_wl
 
 # Load config
 with open('config.json') as config_file:
     config = json.load(config_file)
 
 LIVE_STOCK_CHANNEL_ID = int(config['id_live_stock'])
+REFRESH_DEBOUNCE = 2  # detik menunggu perubahan lain sebelum board di-refresh
+SAFETY_REFRESH_MINUTES = 10
+# Naikkan bila tombol StoreView berubah supaya board lama diedit dengan view baru
+STORE_VIEW_VERSION = '2'
+
+# Batas Discord: 25 field dan 6000 karakter per embed, 1024 karakter per
+# field value. Batas di sini dibuat lebih kecil supaya perubahan kecil
+# (harga, stock) tidak menggeser produk ke halaman lain.
+MAX_FIELDS_PER_PAGE = 20
+MAX_PAGE_CHARS = 5000
+FIELD_VALUE_LIMIT = 1024
+
+def product_field(name, code, stock, price, description):
+    value = (
+        f"💎 Code: `{code}`\n"
+        f"📦 Stock: `{stock}`\n"
+        f"💰 Price: `{price} WL`\n"
+    )
+    if description:
+        value += f"📝 Info: {description}\n"
+    return f"🔸 {name} 🔸"[:256], value[:FIELD_VALUE_LIMIT]
+
+def paginate_fields(fields, max_fields=MAX_FIELDS_PER_PAGE, max_chars=MAX_PAGE_CHARS):
+    """Bagi [(name, value), ...] ke halaman sesuai batas jumlah field dan karakter."""
+    pages = []
+    current = []
+    size = 0
+    for name, value in fields:
+        field_size = len(name) + len(value)
+        if current and (len(current) >= max_fields or size + field_size > max_chars):
+            pages.append(current)
+            current = []
+            size = 0
+        current.append((name, value))
+        size += field_size
+    if current or not pages:
+        pages.append(current)
+    return pages
+
+def render_pages(products, world_info):
+    """Render board live stock sebagai daftar embed, satu per pesan."""
+    fields = []
+    if world_info:
+        world, owner, bot_name = world_info
+        fields.append(("🌍 World Information", f"World: `{world}`\nOwner: `{owner}`\nBot: `{bot_name}`"))
+    fields.extend(product_field(*product) for product in products)
+
+    pages = paginate_fields(fields)
+    now = datetime.utcnow()
+    embeds = []
+    for index, page_fields in enumerate(pages):
+        embed = discord.Embed(
+            title="🏪 Store Stock Status" if index == 0 else "🏪 Store Stock Status (continued)",
+            color=discord.Color.blue(),
+            timestamp=now
+        )
+        for name, value in page_fields:
+            embed.add_field(name=name, value=value, inline=False)
+        if index == 0 and not products:
+            embed.description = "No products available."
+        # Footer tidak ikut fingerprint, jadi nomor halaman tidak memicu edit
+        embed.set_footer(text=f"Page {index + 1}/{len(pages)} • Last Update: {now.strftime('%Y-%m-%d %H:%M:%S UTC')}")
+        embeds.append(embed)
+    return embeds
+
+def embed_fingerprint(embed):
+    """Hash isi embed tanpa bagian yang berubah tiap render (timestamp dan footer)."""
+    payload = embed.to_dict()
+    payload.pop('timestamp', None)
+    payload.pop('footer', None)
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
 
 class BuyModal(Modal):
     def __init__(self, bot):
@@ -35,16 +109,38 @@ class BuyModal(Modal):
     async def on_submit(self, interaction):
         try:
             quantity = int(self.quantity.value)
-            if quantity <= 0:
-                await interaction.response.send_message("Quantity must be positive.", ephemeral=True)
-                return
-                
-            from ext.trx import process_purchase
-            result = await process_purchase(self.bot, interaction.user, self.product_code.value, quantity)
-            await interaction.response.send_message(result, ephemeral=True)
-            
         except ValueError:
             await interaction.response.send_message("Invalid quantity.", ephemeral=True)
+            return
+        if quantity <= 0:
+            await interaction.response.send_message("Quantity must be positive.", ephemeral=True)
+            return
+
+        from ext.trx import process_purchase
+        # Order bisa menunggu di antrian checkout lebih dari 3 detik
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        result = await process_purchase(self.bot, interaction.user, self.product_code.value, quantity)
+        await interaction.followup.send(result, ephemeral=True)
+
+class CartModal(Modal):
+    def __init__(self, bot):
+        super().__init__(title="Buy Multiple Products")
+        self.bot = bot
+
+        self.items = TextInput(
+            label="Products",
+            style=discord.TextStyle.paragraph,
+            placeholder="One product per line, e.g.\nDIRT 2\nGRASS 1",
+            required=True
+        )
+
+        self.add_item(self.items)
+
+    async def on_submit(self, interaction):
+        from ext.trx import process_cart
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        result = await process_cart(self.bot, interaction.user, self.items.value)
+        await interaction.followup.send(result, ephemeral=True)
 
 class SetGrowIDModal(Modal):
     def __init__(self, bot):
@@ -61,207 +157,238 @@ class SetGrowIDModal(Modal):
     
     async def on_submit(self, interaction):
         try:
-            conn = get_connection()
-            cursor = conn.cursor()
-            cursor.execute("INSERT OR REPLACE INTO user_growid (user_id, growid) VALUES (?, ?)",
-                         (interaction.user.id, self.growid.value))
-            cursor.execute("INSERT OR IGNORE INTO users (growid) VALUES (?)",
-                         (self.growid.value,))
-            conn.commit()
-            conn.close()
+            await set_growid(interaction.user.id, self.growid.value)
             await interaction.response.send_message(f"GrowID set to: {self.growid.value}", ephemeral=True)
         except Exception as e:
             logging.error(f'Error in SetGrowIDModal: {e}')
             await interaction.response.send_message("An error occurred while setting GrowID.", ephemeral=True)
 
+class StoreView(discord.ui.View):
+    """Tombol pada board live stock. custom_id tetap agar view bisa dipulihkan setelah restart."""
+
+    def __init__(self, bot):
+        super().__init__(timeout=None)
+        self.bot = bot
+
+    @discord.ui.button(label="Check Balance", style=discord.ButtonStyle.secondary, emoji="💰", custom_id="store:balance")
+    async def balance(self, interaction, button):
+        growid = await get_growid(interaction.user.id)
+        
+        if growid:
+            balance = await get_balance(growid)
+            if balance is not None:
+                balance_wl, balance_dl, balance_bgl = split_wl(balance)
+                embed = discord.Embed(
+                    title="💰 Your Balance",
+                    color=discord.Color.green(),
+                    timestamp=datetime.utcnow()
+                )
+                embed.add_field(name="GrowID", value=growid, inline=True)
+                embed.add_field(name="Total", value=f"{balance:,} WL", inline=True)
+                embed.add_field(name="World Locks", value=f"{balance_wl:,} WL", inline=True)
+                embed.add_field(name="Diamond Locks", value=f"{balance_dl:,} DL", inline=True)
+                embed.add_field(name="Blue Gem Locks", value=f"{balance_bgl:,} BGL", inline=True)
+                await interaction.response.send_message(embed=embed, ephemeral=True)
+            else:
+                await interaction.response.send_message("❌ No balance found for your account.", ephemeral=True)
+        else:
+            await interaction.response.send_message("❌ No GrowID found for your account.", ephemeral=True)
+
+    @discord.ui.button(label="Buy", style=discord.ButtonStyle.primary, emoji="🛒", custom_id="store:buy")
+    async def buy(self, interaction, button):
+        modal = BuyModal(self.bot)
+        await interaction.response.send_modal(modal)
+
+    @discord.ui.button(label="Cart", style=discord.ButtonStyle.primary, emoji="🧺", custom_id="store:cart")
+    async def cart(self, interaction, button):
+        modal = CartModal(self.bot)
+        await interaction.response.send_modal(modal)
+
+    @discord.ui.button(label="Set GrowID", style=discord.ButtonStyle.success, emoji="📝", custom_id="store:set_growid")
+    async def set_growid(self, interaction, button):
+        modal = SetGrowIDModal(self.bot)
+        await interaction.response.send_modal(modal)
+
+    @discord.ui.button(label="Check GrowID", style=discord.ButtonStyle.secondary, emoji="🔍", custom_id="store:check_growid")
+    async def check_growid(self, interaction, button):
+        growid = await get_growid(interaction.user.id)
+        
+        if growid:
+            embed = discord.Embed(
+                title="🔍 GrowID Information",
+                description=f"Your registered GrowID: `{growid}`",
+                color=discord.Color.blue(),
+                timestamp=datetime.utcnow()
+            )
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+        else:
+            await interaction.response.send_message("❌ No GrowID registered for your account.", ephemeral=True)
+
+    @discord.ui.button(label="World Info", style=discord.ButtonStyle.secondary, emoji="🌍", custom_id="store:world")
+    async def world(self, interaction, button):
+        world_info = await get_world_info()
+        
+        if world_info:
+            world, owner, bot_name = world_info
+            embed = discord.Embed(
+                title="🌍 World Information",
+                color=discord.Color.blue(),
+                timestamp=datetime.utcnow()
+            )
+            embed.add_field(name="World", value=world, inline=True)
+            embed.add_field(name="Owner", value=owner, inline=True)
+            embed.add_field(name="Bot", value=bot_name, inline=True)
+            await interaction.response.send_message(embed=embed, ephemeral=True)
+        else:
+            await interaction.response.send_message("❌ No world information available.", ephemeral=True)
+
 class LiveStock(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.message_id = None
+        self.pages = []  # [{'id', 'message', 'fingerprint'}] sesuai urutan halaman
+        self.view_version = None
+        self._state_loaded = False
+        # View dibuat sekali dan didaftarkan sebagai persistent view, sehingga
+        # tombol pada board lama tetap berfungsi setelah restart
+        self.view = StoreView(bot)
+        bot.add_view(self.view)
+        self._refresh_lock = asyncio.Lock()
+        self._pending_refresh = None
         self.live_stock.start()
 
-    def db_connect(self):
-        return get_connection()
-
     def cog_unload(self):
         self.live_stock.cancel()
+        self.view.stop()
+        if self._pending_refresh:
+            self._pending_refresh.cancel()
 
-    @tasks.loop(minutes=1)
+    @commands.Cog.listener()
+    async def on_store_update(self, product_code=None):
+        # Dikirim lewat bot.dispatch('store_update', kode) setiap kali stock,
+        # harga, deskripsi atau world info berubah. Perubahan yang datang
+        # beruntun digabung menjadi satu refresh.
+        if self._pending_refresh is None:
+            self._pending_refresh = asyncio.create_task(self._debounced_refresh())
+
+    async def _debounced_refresh(self):
+        await asyncio.sleep(REFRESH_DEBOUNCE)
+        # Perubahan yang datang selama refresh berjalan menjadwalkan refresh baru
+        self._pending_refresh = None
+        await self.refresh_board()
+
+    # Hanya jaring pengaman; refresh normal dipicu oleh on_store_update
+    @tasks.loop(minutes=SAFETY_REFRESH_MINUTES)
     async def live_stock(self):
+        await self.refresh_board()
+
+    async def refresh_board(self):
+        async with self._refresh_lock:
+            await self._refresh_board()
+
+    async def _load_pages(self):
+        pages = await get_state('live_stock_pages')
+        if pages is not None:
+            self.pages = [dict(page, message=None) for page in json.loads(pages)]
+        else:
+            # Board satu pesan dari versi sebelumnya
+            message_id = await get_state('live_stock_message_id')
+            if message_id:
+                self.pages = [{
+                    'id': int(message_id),
+                    'message': None,
+                    'fingerprint': await get_state('live_stock_fingerprint'),
+                }]
+        self.view_version = await get_state('live_stock_view_version')
+
+    async def _save_pages(self):
+        pages = [{'id': page['id'], 'fingerprint': page['fingerprint']} for page in self.pages]
+        await set_state('live_stock_pages', json.dumps(pages))
+
+    async def _refresh_board(self):
         channel = self.bot.get_channel(LIVE_STOCK_CHANNEL_ID)
         if not channel:
             logging.error('Live stock channel not found')
             return
 
-        conn = self.db_connect()
-        cursor = conn.cursor()
-        
-        # Get stock information with available items count
-        cursor.execute("""
-            SELECT 
-                p.name, 
-                p.code, 
-                COUNT(CASE WHEN ps.used = 0 THEN 1 END) as available_stock,
-                p.price,
-                p.description
-            FROM products p
-            LEFT JOIN product_stock ps ON p.code = ps.product_code
-            GROUP BY p.code
-            ORDER BY p.name
-        """)
-        products = cursor.fetchall()
-        
-        # Get world info
-        cursor.execute("SELECT world, owner, bot FROM world_info WHERE id = 1")
-        world_info = cursor.fetchone()
-        
-        conn.close()
+        # Daftar pesan board dan fingerprint-nya disimpan supaya restart
+        # tidak mengirim board baru
+        if not self._state_loaded:
+            await self._load_pages()
+            self._state_loaded = True
 
-        embed = discord.Embed(
-            title="🏪 Store Stock Status",
-            color=discord.Color.blue(),
-            timestamp=datetime.utcnow()
-        )
+        def load_board(conn):
+            cursor = conn.cursor()
 
-        if world_info:
-            world, owner, bot_name = world_info
-            embed.add_field(
-                name="🌍 World Information",
-                value=f"World: `{world}`\nOwner: `{owner}`\nBot: `{bot_name}`",
-                inline=False
-            )
+            # Get stock information with available items count
+            cursor.execute(SQL_LIVE_STOCK)
+            products = cursor.fetchall()
 
-        if products:
-            for name, code, stock, price, description in products:
-                value = (
-                    f"💎 Code: `{code}`\n"
-                    f"📦 Stock: `{stock}`\n"
-                    f"💰 Price: `{price} WL`\n"
-                )
-                if description:
-                    value += f"📝 Info: {description}\n"
-                
-                embed.add_field(
-                    name=f"🔸 {name} 🔸",
-                    value=value,
-                    inline=False
-                )
-        else:
-            embed.description = "No products available."
+            # Get world info
+            cursor.execute("SELECT world, owner, bot FROM world_info WHERE id = 1")
+            world_info = cursor.fetchone()
+            return products, world_info
 
-        embed.set_footer(text=f"Last Update: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S UTC')}")
+        products, world_info = await db.read(load_board)
+        embeds = render_pages(products, world_info)
 
-        # Create view with buttons
-        view = discord.ui.View()
-        
-        # Add buttons
-        button_balance = Button(label="Check Balance", style=discord.ButtonStyle.secondary, emoji="💰")
-        button_buy = Button(label="Buy", style=discord.ButtonStyle.primary, emoji="🛒")
-        button_set_growid = Button(label="Set GrowID", style=discord.ButtonStyle.success, emoji="📝")
-        button_check_growid = Button(label="Check GrowID", style=discord.ButtonStyle.secondary, emoji="🔍")
-        button_world = Button(label="World Info", style=discord.ButtonStyle.secondary, emoji="🌍")
-
-        async def button_balance_callback(interaction):
-            conn = self.db_connect()
-            cursor = conn.cursor()
-            cursor.execute("SELECT growid FROM user_growid WHERE user_id = ?", (interaction.user.id,))
-            growid = cursor.fetchone()
-            conn.close()
-            
-            if growid:
-                balance = get_balance(growid[0])
-                if balance:
-                    balance_wl, balance_dl, balance_bgl = balance
-                    embed = discord.Embed(
-                        title="💰 Your Balance",
-                        color=discord.Color.green(),
-                        timestamp=datetime.utcnow()
-                    )
-                    embed.add_field(name="GrowID", value=growid[0], inline=False)
-                    embed.add_field(name="World Locks", value=f"{balance_wl:,} WL", inline=True)
-                    embed.add_field(name="Diamond Locks", value=f"{balance_dl:,} DL", inline=True)
-                    embed.add_field(name="Blue Gem Locks", value=f"{balance_bgl:,} BGL", inline=True)
-                    await interaction.response.send_message(embed=embed, ephemeral=True)
-                else:
-                    await interaction.response.send_message("❌ No balance found for your account.", ephemeral=True)
+        # Hanya halaman yang fingerprint-nya berubah yang diedit
+        changed = False
+        for index, embed in enumerate(embeds):
+            page = self.pages[index] if index < len(self.pages) else None
+            fingerprint = embed_fingerprint(embed)
+            resend_view = index == 0 and self.view_version != STORE_VIEW_VERSION
+            if page and page['fingerprint'] == fingerprint and not resend_view:
+                continue
+            try:
+                message = await self._publish_page(channel, page, embed, index == 0)
+            except Exception as e:
+                logging.error(f'Error updating live stock page {index + 1}: {e}')
+                continue
+            new_page = {'id': message.id, 'message': message, 'fingerprint': fingerprint}
+            if page:
+                self.pages[index] = new_page
             else:
-                await interaction.response.send_message("❌ No GrowID found for your account.", ephemeral=True)
-
-        async def button_buy_callback(interaction):
-            modal = BuyModal(self.bot)
-            await interaction.response.send_modal(modal)
+                self.pages.append(new_page)
+            if index == 0:
+                self.view_version = STORE_VIEW_VERSION
+                await set_state('live_stock_view_version', STORE_VIEW_VERSION)
+            changed = True
 
-        async def button_set_growid_callback(interaction):
-            modal = SetGrowIDModal(self.bot)
-            await interaction.response.send_modal(modal)
+        # Katalog mengecil: hapus halaman yang tidak terpakai lagi
+        for page in self.pages[len(embeds):]:
+            try:
+                await (page['message'] or channel.get_partial_message(page['id'])).delete()
+            except discord.NotFound:
+                pass
+            except Exception as e:
+                logging.error(f'Error deleting live stock page: {e}')
+            changed = True
+        del self.pages[len(embeds):]
 
-        async def button_check_growid_callback(interaction):
-            conn = self.db_connect()
-            cursor = conn.cursor()
-            cursor.execute("SELECT growid FROM user_growid WHERE user_id = ?", (interaction.user.id,))
-            growid = cursor.fetchone()
-            conn.close()
-            
-            if growid:
-                embed = discord.Embed(
-                    title="🔍 GrowID Information",
-                    description=f"Your registered GrowID: `{growid[0]}`",
-                    color=discord.Color.blue(),
-                    timestamp=datetime.utcnow()
-                )
-                await interaction.response.send_message(embed=embed, ephemeral=True)
-            else:
-                await interaction.response.send_message("❌ No GrowID registered for your account.", ephemeral=True)
+        if changed:
+            await self._save_pages()
 
-        async def button_world_callback(interaction):
-            conn = self.db_connect()
-            cursor = conn.cursor()
-            cursor.execute("SELECT world, owner, bot FROM world_info WHERE id = 1")
-            world_info = cursor.fetchone()
-            conn.close()
-            
-            if world_info:
-                world, owner, bot_name = world_info
-                embed = discord.Embed(
-                    title="🌍 World Information",
-                    color=discord.Color.blue(),
-                    timestamp=datetime.utcnow()
-                )
-                embed.add_field(name="World", value=world, inline=True)
-                embed.add_field(name="Owner", value=owner, inline=True)
-                embed.add_field(name="Bot", value=bot_name, inline=True)
-                await interaction.response.send_message(embed=embed, ephemeral=True)
-            else:
-                await interaction.response.send_message("❌ No world information available.", ephemeral=True)
-
-        # Set button callbacks
-        button_balance.callback = button_balance_callback
-        button_buy.callback = button_buy_callback
-        button_set_growid.callback = button_set_growid_callback
-        button_check_growid.callback = button_check_growid_callback
-        button_world.callback = button_world_callback
-
-        # Add buttons to view
-        view.add_item(button_balance)
-        view.add_item(button_buy)
-        view.add_item(button_set_growid)
-        view.add_item(button_check_growid)
-        view.add_item(button_world)
-
-        # Update or send message
-        try:
-            if self.message_id:
-                try:
-                    message = await channel.fetch_message(self.message_id)
-                    await message.edit(embed=embed, view=view)
-                except discord.NotFound:
-                    message = await channel.send(embed=embed, view=view)
-                    self.message_id = message.id
-            else:
-                message = await channel.send(embed=embed, view=view)
-                self.message_id = message.id
-        except Exception as e:
-            logging.error(f'Error updating live stock message: {e}')
+    async def _publish_page(self, channel, page, embed, first):
+        """
+        Edit pesan halaman lewat objek yang di-cache (atau PartialMessage setelah
+        restart) tanpa fetch_message; kirim pesan baru bila belum ada atau sudah
+        dihapus. Tombol hanya ada di halaman pertama dan hanya dikirim ulang bila
+        versi view berubah; StoreView persisten tetap terpasang pada pesan yang sama.
+        """
+        message = None
+        if page:
+            message = page['message'] or channel.get_partial_message(page['id'])
+        if message is not None:
+            changes = {'embed': embed}
+            if first and self.view_version != STORE_VIEW_VERSION:
+                changes['view'] = self.view
+            try:
+                return await message.edit(**changes)
+            except discord.NotFound:
+                pass
+        if first:
+            return await channel.send(embed=embed, view=self.view)
+        return await channel.send(embed=embed)
 
     @live_stock.before_loop
     async def before_live_stock(self):
@@ -0,0 +1,96 @@
+import asyncio
+import datetime
+import json
+import logging
+from discord.ext import commands
+from database import db, SQL_DELETE_STOCK_BATCH, SQL_ARCHIVE_STOCK_BATCH
+
+# Baca konfigurasi dari config.json
+with open('config.json') as config_file:
+    config = json.load(config_file)
+
+# Item terjual yang lebih tua dari ini dipindah ke product_stock_archive; 0 = nonaktif
+ARCHIVE_AFTER_DAYS = int(config.get('archive_after_days', 30))
+MAINTENANCE_BATCH = 5000     # baris per transaksi
+BATCH_PAUSE = 0.05           # detik jeda antar batch, supaya order tetap dapat giliran writer
+MAINTENANCE_INTERVAL = 3600  # detik antar putaran bila tidak ada permintaan baru
+
+SQL_ARCHIVE_INSERT = """
+    INSERT OR IGNORE INTO product_stock_archive (
+        id, product_code, content, content_hash, used_by, used_at, added_by, added_at, source_file
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+def delete_stock_batch(conn, code, limit):
+    """Hapus sampai `limit` item stock produk `code`; antrian selesai bila sisanya habis."""
+    deleted = conn.execute(SQL_DELETE_STOCK_BATCH, (code, limit)).rowcount
+    if deleted < limit:
+        conn.execute("DELETE FROM stock_deletions WHERE product_code = ?", (code,))
+    return deleted
+
+def archive_stock_batch(conn, cutoff, limit):
+    """Pindahkan sampai `limit` item terjual sebelum `cutoff` ke arsip."""
+    rows = conn.execute(SQL_ARCHIVE_STOCK_BATCH, (cutoff, limit)).fetchall()
+    conn.executemany(SQL_ARCHIVE_INSERT, rows)
+    return len(rows)
+
+class Maintenance(commands.Cog):
+    """Hapus stock produk yang sudah dihapus dan arsipkan item terjual, per batch di background."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self.task = None
+        self.wakeup = asyncio.Event()
+
+    async def cog_load(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def cog_unload(self):
+        if self.task:
+            self.task.cancel()
+
+    @commands.Cog.listener()
+    async def on_stock_cleanup(self):
+        self.wakeup.set()
+
+    async def run(self):
+        while True:
+            self.wakeup.clear()
+            try:
+                await self.delete_pending()
+                await self.archive_used()
+            except Exception as e:
+                logging.error(f'Error in stock maintenance: {e}')
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), MAINTENANCE_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def delete_pending(self):
+        for (code,) in await db.fetchall("SELECT product_code FROM stock_deletions ORDER BY requested_at"):
+            total = 0
+            while True:
+                deleted = await db.write(delete_stock_batch, code, MAINTENANCE_BATCH)
+                total += deleted
+                if deleted < MAINTENANCE_BATCH:
+                    break
+                await asyncio.sleep(BATCH_PAUSE)
+            logging.info(f'Deleted {total} stock items of removed product {code}')
+
+    async def archive_used(self):
+        if ARCHIVE_AFTER_DAYS <= 0:
+            return
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=ARCHIVE_AFTER_DAYS)
+        cutoff = cutoff.strftime('%Y-%m-%d %H:%M:%S')
+        total = 0
+        while True:
+            archived = await db.write(archive_stock_batch, cutoff, MAINTENANCE_BATCH)
+            total += archived
+            if archived < MAINTENANCE_BATCH:
+                break
+            await asyncio.sleep(BATCH_PAUSE)
+        if total:
+            logging.info(f'Archived {total} sold stock items used before {cutoff}')
+
+async def setup(bot):
+    await bot.add_cog(Maintenance(bot))
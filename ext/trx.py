@@ -1,9 +1,16 @@
-import sqlite3
 import json
+import asyncio
 import logging
-from discord import File, Embed
+from discord import Embed
+from discord import app_commands
 from discord.ext import commands
-from database import get_connection
+from cache import balances
+from catalog import catalog
+from delivery import build_receipt
+from outbound import outbound, dm_route, channel_route, PRIORITY_DM, PRIORITY_CHANNEL, PRIORITY_LOG
+from events import events
+from database import db, get_growid, claim_stock, next_order_number, SQL_GROWID_BY_USER, InsufficientBalance, InsufficientStock, ProductUnavailable
+from ext.balance_manager import debit, get_balance, split_wl
 import datetime
 from datetime import datetime, timezone
 
@@ -11,182 +18,334 @@ from datetime import datetime, timezone
 with open('config.json') as config_file:
     config = json.load(config_file)
 
-ID_LOG_PURCH = config['id_log_purch']  # Channel ID untuk log pembelian
-ID_HISTORY_BUY = config['id_history_buy']  # Channel ID untuk riwayat pembelian
+ID_LOG_PURCH = int(config['id_log_purch'])  # Channel ID untuk log pembelian
+ID_HISTORY_BUY = int(config['id_history_buy'])  # Channel ID untuk riwayat pembelian
 
 DATABASE = 'store.db'
+CHECKOUT_MAX_BATCH = 50     # order maksimal per transaksi
+CHECKOUT_MAX_PENDING = 200  # order yang boleh mengantri per produk
+MAX_CART_PRODUCTS = 10      # produk berbeda per keranjang
+
+class PurchaseError(Exception):
+    """Pembelian ditolak; transaksi di-rollback dan pesan dikirim ke pembeli."""
+
+class CheckoutBusy(PurchaseError):
+    def __init__(self, message="⏳ The store is busy right now, please try again in a moment."):
+        super().__init__(message)
+
+def _order_txn(conn, user, lines, formatted_time):
+    """
+    Satu order untuk satu atau beberapa produk: satu nomor order, satu debit
+    saldo, lalu klaim stock per produk. lines = [(kode, jumlah, harga satuan)].
+    Kembalikan (nomor order, growid, total harga, [(kode, jumlah, subtotal, items)]).
+    """
+    cursor = conn.cursor()
+
+    order_count = next_order_number(conn)
+
+    # Harga diambil dari katalog; produk yang sudah dihapus setelah order
+    # masuk antrian ditolak oleh claim_stock (ProductUnavailable)
+    total_price = sum(price * quantity for _, quantity, price in lines)
+
+    # Cek GrowID dan balance
+    cursor.execute(SQL_GROWID_BY_USER, (user.id,))
+    growid = cursor.fetchone()
+    if not growid:
+        raise PurchaseError("❌ No GrowID found for your account.")
+
+    # Debit saldo dan klaim item di transaksi yang sama; bila salah satu
+    # gagal, semuanya di-rollback
+    debit(conn, growid[0], total_price, 'purchase', f"order:{order_count}")
+    delivered = []
+    for product_code, quantity, price in lines:
+        try:
+            items = claim_stock(conn, product_code, quantity, str(user), formatted_time)
+        except ProductUnavailable:
+            raise
+        except InsufficientStock:
+            raise InsufficientStock(f"Not enough stock available for {product_code}.")
+
+        # Log ke database purchases
+        cursor.execute("""
+            INSERT INTO purchases (
+                order_number, user_id, product, quantity, purchase_date, total_price
+            ) VALUES (?, ?, ?, ?, ?, ?)
+        """, (order_count, user.id, product_code, quantity, formatted_time, price * quantity))
+        delivered.append((product_code, quantity, price * quantity, items))
+
+    return order_count, growid[0], total_price, delivered
+
+def _purchase_txn(conn, user, product_code, quantity, price, formatted_time):
+    return _order_txn(conn, user, [(product_code, quantity, price)], formatted_time)
+
+def _checkout_batch(conn, orders):
+    """
+    Jalankan beberapa order dalam satu transaksi. Setiap order memakai
+    SAVEPOINT sendiri sehingga order yang ditolak (stock atau saldo kurang)
+    di-rollback tanpa membatalkan order lain. Kembalikan hasil _purchase_txn
+    atau exception penolakan untuk setiap order.
+    """
+    results = []
+    for order in orders:
+        conn.execute("SAVEPOINT checkout_order")
+        try:
+            results.append(_purchase_txn(conn, *order))
+        except (PurchaseError, InsufficientBalance, InsufficientStock) as e:
+            conn.execute("ROLLBACK TO checkout_order")
+            results.append(e)
+        conn.execute("RELEASE checkout_order")
+    return results
+
+class CheckoutQueue:
+    """
+    Antrian pembelian per kode produk. Satu worker per produk mengambil order
+    yang sudah mengantri (sampai CHECKOUT_MAX_BATCH) dan menjalankannya dalam
+    satu transaksi; order yang masuk selama transaksi berjalan ikut batch
+    berikutnya. Antrian yang penuh langsung ditolak dengan CheckoutBusy.
+    """
+
+    def __init__(self):
+        self._pending = {}  # product_code -> [(order, future)]
+        self._workers = {}  # product_code -> task
+
+    def submit(self, user, product_code, quantity, price, formatted_time):
+        pending = self._pending.setdefault(product_code, [])
+        if len(pending) >= CHECKOUT_MAX_PENDING:
+            raise CheckoutBusy()
+        future = asyncio.get_running_loop().create_future()
+        pending.append(((user, product_code, quantity, price, formatted_time), future))
+        if product_code not in self._workers:
+            self._workers[product_code] = asyncio.create_task(self._run(product_code))
+        return future
+
+    async def _run(self, product_code):
+        pending = self._pending[product_code]
+        try:
+            while pending:
+                batch = pending[:CHECKOUT_MAX_BATCH]
+                del pending[:CHECKOUT_MAX_BATCH]
+                try:
+                    results = await db.write(_checkout_batch, [order for order, _ in batch])
+                except Exception as e:
+                    logging.error(f"Error committing {len(batch)} orders for {product_code}: {e}")
+                    results = [e] * len(batch)
+                for (_, future), result in zip(batch, results):
+                    if future.done():
+                        continue
+                    if isinstance(result, Exception):
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+        finally:
+            del self._workers[product_code]
+            # Worker dibatalkan (cog di-unload): jangan biarkan pembeli menunggu selamanya
+            for _, future in pending:
+                future.cancel()
+            self._pending.pop(product_code, None)
+
+    async def close(self):
+        if self._workers:
+            await asyncio.gather(*self._workers.values(), return_exceptions=True)
+
+checkout = CheckoutQueue()
+
+def parse_cart(text):
+    """
+    Baca isi keranjang, misalnya "DIRT:2, GRASS" atau satu produk per baris
+    ("DIRT 2"). Kode yang sama digabung. Kembalikan [(kode, jumlah)].
+    """
+    cart = {}
+    for entry in text.replace('\n', ',').split(','):
+        parts = entry.replace(':', ' ').split()
+        if not parts:
+            continue
+        if len(parts) > 2 or (len(parts) == 2 and not parts[1].isdigit()):
+            raise PurchaseError(f"❌ Invalid cart entry: `{entry.strip()}`. Use `CODE:QUANTITY`.")
+        quantity = int(parts[1]) if len(parts) == 2 else 1
+        if quantity < 1:
+            raise PurchaseError(f"❌ Quantity for {parts[0]} must be at least 1.")
+        cart[parts[0]] = cart.get(parts[0], 0) + quantity
+    if not cart:
+        raise PurchaseError("❌ Your cart is empty.")
+    if len(cart) > MAX_CART_PRODUCTS:
+        raise PurchaseError(f"❌ A cart can hold at most {MAX_CART_PRODUCTS} different products.")
+    return list(cart.items())
+
+def _enqueue_receipt(receipt, destination, route, priority, content=None):
+    for index in range(receipt.message_count()):
+        outbound.enqueue(
+            route,
+            lambda index=index: receipt.send_message(destination, index, content if index == 0 else None),
+            priority,
+            f"receipt {receipt.name} to {route}",
+        )
+
+def _deliver_order(bot, user, order_count, growid, formatted_time, total_price, delivered):
+    """
+    Jadwalkan file hasil order ke channel log, ringkasan ke channel history
+    dan DM ke pembeli. Dipanggil setelah commit; tidak menunggu Discord.
+    """
+    summary = ", ".join(f"{quantity}x {product_code}" for product_code, quantity, _, _ in delivered)
+
+    # File hasil dibuat sekali di memori dan dipakai untuk log dan DM
+    receipt = build_receipt(user.name, order_count, formatted_time, total_price, delivered)
+
+    # Send to buyer via DM
+    products = "\n".join(
+        f"Product: **{product_code}** × **{quantity}** ({subtotal} WL)"
+        for product_code, quantity, subtotal, _ in delivered
+    )
+    _enqueue_receipt(
+        receipt, user, dm_route(user), PRIORITY_DM,
+        content=f"🛍️ Your Purchase (Order #{order_count})\n"
+                f"Time: `{formatted_time}`\n\n"
+                f"{products}\n"
+                f"Total Price: **{total_price} WL**\n\n"
+                f"Your items are in the attached file:"
+    )
+
+    # Send to history channel
+    channel_history = bot.get_channel(ID_HISTORY_BUY)
+    if channel_history:
+        content = (
+            f"<a:Arrow:1152710828395593729>Buyer: **{user.mention}**\n"
+            f"<a:Arrow:1152710828395593729>Produk: **{summary} ( {growid} // {user.name} )**\n"
+            f"<a:Arrow:1152710828395593729>Jumlah: **{sum(line[1] for line in delivered)}**\n"
+            f"<a:Arrow:1152710828395593729>Total Price: **{total_price} <:WL:1146360510888034356>**\n"
+            f"**Thanks For Purchasing Our Product**"
+        )
+        outbound.enqueue(channel_route(channel_history), lambda: channel_history.send(content),
+                         PRIORITY_CHANNEL, f"history for order #{order_count}")
+    else:
+        logging.error('Purchase history channel not found')
+
+    # Send to log channel
+    channel_log = bot.get_channel(ID_LOG_PURCH)
+    if channel_log:
+        _enqueue_receipt(receipt, channel_log, channel_route(channel_log), PRIORITY_LOG)
+    else:
+        logging.error('Purchase log channel not found')
+
+def _order_committed(bot, order_count, growid, delivered):
+    balances.invalidate(growid)
+    for product_code, quantity, subtotal, _ in delivered:
+        bot.dispatch('store_update', product_code)
+        events.publish('order', order_number=order_count, growid=growid, product_code=product_code,
+                       quantity=quantity, total_price=subtotal)
 
 async def process_purchase(bot, user, product_code, quantity):
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-
         # Get current UTC time
         current_time = datetime.now(timezone.utc)
         formatted_time = current_time.strftime("%Y-%m-%d %H:%M:%S")
 
-        # Get last order number
-        cursor.execute("SELECT COUNT(*) FROM purchases")
-        order_count = cursor.fetchone()[0] + 1
-
-        # Cek produk dan harga
-        cursor.execute("SELECT stock, price FROM products WHERE code = ?", (product_code,))
-        product_info = cursor.fetchone()
-        if not product_info:
+        product = catalog.get(product_code)
+        if product is None:
             return "Product not found."
 
-        stock, price = product_info
-        total_price = price * quantity
-
-        # Cek GrowID dan balance
-        cursor.execute("SELECT growid FROM user_growid WHERE user_id = ?", (user.id,))
-        growid = cursor.fetchone()
-        if growid:
-            cursor.execute("SELECT balance_wl FROM users WHERE growid = ?", (growid[0],))
-            user_balance = cursor.fetchone()
-            if not user_balance or user_balance[0] < total_price:
-                return "Insufficient balance."
-
-            # Cek stock yang tersedia
-            cursor.execute("""
-                SELECT id, content 
-                FROM product_stock 
-                WHERE product_code = ? AND used = 0 
-                LIMIT ?
-            """, (product_code, quantity))
-            
-            items = cursor.fetchall()
-            if len(items) < quantity:
-                return "Not enough stock available."
-
-            # Update status items
-            for item_id, _ in items:
-                cursor.execute("""
-                    UPDATE product_stock 
-                    SET used = 1,
-                        used_by = ?,
-                        used_at = ?
-                    WHERE id = ?
-                """, (str(user), formatted_time, item_id))
-
-            # Update stock dan balance
-            cursor.execute("UPDATE products SET stock = stock - ? WHERE code = ?", 
-                         (quantity, product_code))
-            cursor.execute("UPDATE users SET balance_wl = balance_wl - ? WHERE growid = ?", 
-                         (total_price, growid[0]))
-
-            # Log ke database purchases
-            cursor.execute("""
-                INSERT INTO purchases (
-                    order_number, user_id, product, quantity, purchase_date, total_price
-                ) VALUES (?, ?, ?, ?, ?, ?)
-            """, (order_count, user.id, product_code, quantity, formatted_time, total_price))
-
-            # Prepare items content
-            items_content = "\n".join([f"{i+1}. {item[1]}" for i, item in enumerate(items)])
-            
-            # Save to result file
-            result_filename = f"result ({user.name}).txt"
-            with open(result_filename, 'w', encoding='utf-8') as f:
-                f.write(f"Current Date and Time (UTC - YYYY-MM-DD HH:MM:SS formatted): {formatted_time}\n")
-                f.write(f"Current User's Login: {user.name}\n\n")
-                f.write(f"Order #{order_count}\n")
-                f.write(f"Product: {product_code}\n")
-                f.write(f"Quantity: {quantity}\n")
-                f.write(f"Total Price: {total_price} WL\n\n")
-                f.write("Items:\n")
-                f.write(items_content)
-
-            # Send to log channel
-            channel_log = bot.get_channel(ID_LOG_PURCH)
-            if channel_log:
-                file = File(result_filename)
-                await channel_log.send(file=file)
-
-            # Send to history channel
-            channel_history = bot.get_channel(ID_HISTORY_BUY)
-            if channel_history:
-                await channel_history.send(
-                    f"<a:Arrow:1152710828395593729>Buyer: **{user.mention}**\n"
-                    f"<a:Arrow:1152710828395593729>Produk: **{product_code} ( {growid[0]} // {user.name} )**\n"
-                    f"<a:Arrow:1152710828395593729>Jumlah: **{quantity}**\n"
-                    f"<a:Arrow:1152710828395593729>Total Price: **{total_price} <:WL:1146360510888034356>**\n"
-                    f"**Thanks For Purchasing Our Product**"
-                )
-
-            # Send to buyer via DM
-            try:
-                file_dm = File(result_filename)
-                await user.send(
-                    content=f"🛍️ Your Purchase (Order #{order_count})\n"
-                            f"Time: `{formatted_time}`\n\n"
-                            f"Product: **{product_code}**\n"
-                            f"Quantity: **{quantity}**\n"
-                            f"Total Price: **{total_price} WL**\n\n"
-                            f"Your items are in the attached file:",
-                    file=file_dm
-                )
-            except discord.Forbidden:
-                logging.warning(f"Could not send DM to {user}")
-
-            # Clean up file
-            try:
-                os.remove(result_filename)
-            except:
-                pass
-
-            conn.commit()
-            conn.close()
-            return f"✅ Successfully purchased {quantity} of {product_code} for {total_price} WL."
-        else:
-            return "❌ No GrowID found for your account."
+        try:
+            order_count, growid, total_price, delivered = await checkout.submit(
+                user, product_code, quantity, product.price, formatted_time
+            )
+        except (PurchaseError, InsufficientBalance, InsufficientStock) as e:
+            return str(e)
+
+        _order_committed(bot, order_count, growid, delivered)
+        _deliver_order(bot, user, order_count, growid, formatted_time, total_price, delivered)
+
+        return f"✅ Successfully purchased {quantity} of {product_code} for {total_price} WL."
     except Exception as e:
         logging.error(f'Error in process_purchase: {e}')
         return f"❌ An error occurred: {e}"
 
+async def process_cart(bot, user, cart_text):
+    """Beli beberapa produk sekaligus sebagai satu order dengan satu debit saldo."""
+    try:
+        current_time = datetime.now(timezone.utc)
+        formatted_time = current_time.strftime("%Y-%m-%d %H:%M:%S")
+
+        try:
+            cart = parse_cart(cart_text)
+            lines = []
+            for product_code, quantity in cart:
+                product = catalog.get(product_code)
+                if product is None:
+                    raise PurchaseError(f"Product {product_code} not found.")
+                lines.append((product_code, quantity, product.price))
+
+            order_count, growid, total_price, delivered = await db.write(
+                _order_txn, user, lines, formatted_time
+            )
+        except (PurchaseError, InsufficientBalance, InsufficientStock) as e:
+            return str(e)
+
+        _order_committed(bot, order_count, growid, delivered)
+        _deliver_order(bot, user, order_count, growid, formatted_time, total_price, delivered)
+
+        summary = ", ".join(f"{quantity}x {product_code}" for product_code, quantity, _, _ in delivered)
+        return f"✅ Order #{order_count}: purchased {summary} for {total_price} WL."
+    except Exception as e:
+        logging.error(f'Error in process_cart: {e}')
+        return f"❌ An error occurred: {e}"
+
+async def product_code_autocomplete(interaction, current):
+    # Dijawab dari katalog di memori supaya selalu dalam batas 3 detik Discord
+    return [
+        app_commands.Choice(name=f"{product.code} - {product.name} ({product.price} WL)"[:100], value=product.code)
+        for product in catalog.complete(current)
+    ]
+
 class Trx(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
 
-    @commands.command()
+    async def cog_unload(self):
+        await checkout.close()
+
+    @commands.hybrid_command()
+    @app_commands.describe(product_code="Product code", quantity="Number of items")
+    @app_commands.autocomplete(product_code=product_code_autocomplete)
     async def buy(self, ctx, product_code: str, quantity: int = 1):
         """
         Buy a product
-        Usage: !buy <product_code> [quantity]
+        Usage: !buy <product_code> [quantity] or /buy
         """
         logging.info(f'Buy command invoked by {ctx.author}')
         if quantity < 1:
             await ctx.send("❌ Quantity must be at least 1.")
             return
 
+        # Slash command: balasan bisa lebih dari 3 detik saat antrian penuh
+        await ctx.defer(ephemeral=True)
         result = await process_purchase(self.bot, ctx.author, product_code, quantity)
         await ctx.send(result)
 
+    @commands.command()
+    async def cart(self, ctx, *, items: str):
+        """
+        Buy several products in one order
+        Usage: !cart <code>[:quantity], <code>[:quantity], ...
+        """
+        logging.info(f'Cart command invoked by {ctx.author}')
+        result = await process_cart(self.bot, ctx.author, items)
+        await ctx.send(result)
+
     @commands.command()
     async def check(self, ctx):
         """Check your GrowID and balance"""
         try:
-            conn = get_connection()
-            cursor = conn.cursor()
-
-            cursor.execute("SELECT growid FROM user_growid WHERE user_id = ?", (ctx.author.id,))
-            growid = cursor.fetchone()
+            growid = await get_growid(ctx.author.id)
 
             if growid:
-                cursor.execute("""
-                    SELECT balance_wl, balance_dl, balance_bgl 
-                    FROM users 
-                    WHERE growid = ?
-                """, (growid[0],))
-                balance = cursor.fetchone()
-
-                if balance:
+                balance = await get_balance(growid)
+
+                if balance is not None:
+                    wl, dl, bgl = split_wl(balance)
                     current_time = datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
                     embed = Embed(title="Account Information", color=0x00ff00)
-                    embed.add_field(name="GrowID", value=growid[0], inline=True)
-                    embed.add_field(name="Balance (WL)", value=str(balance[0]), inline=True)
-                    embed.add_field(name="Balance (DL)", value=str(balance[1]), inline=True)
-                    embed.add_field(name="Balance (BGL)", value=str(balance[2]), inline=True)
+                    embed.add_field(name="GrowID", value=growid, inline=True)
+                    embed.add_field(name="Balance", value=f"{balance:,} WL", inline=True)
+                    embed.add_field(name="Breakdown", value=f"{bgl:,} BGL, {dl} DL, {wl} WL", inline=True)
                     embed.set_footer(text=f"Requested by {ctx.author} • {current_time}")
                     
                     await ctx.send(embed=embed)
@@ -195,7 +354,6 @@ class Trx(commands.Cog):
             else:
                 await ctx.send("❌ No GrowID registered for your account.")
 
-            conn.close()
         except Exception as e:
             logging.error(f'Error in check command: {e}')
             await ctx.send(f"❌ An error occurred: {e}")
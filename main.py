@@ -5,6 +5,7 @@ import json
 import logging
 import asyncio
 from database import init_db, get_connection
+from catalog import catalog
 
 # Setup logging
 logging.basicConfig(level=logging.INFO)
@@ -40,6 +41,13 @@ async def on_message(message):
     logging.info(f'Message from {message.author}: {message.content}')
     await bot.process_commands(message)
 
+@bot.event
+async def setup_hook():
+    # Slash command (mis. /buy) disinkronkan ke guild supaya langsung tersedia
+    guild = discord.Object(id=int(GUILD_ID))
+    bot.tree.copy_global_to(guild=guild)
+    await bot.tree.sync(guild=guild)
+
 async def load_extensions():
     # Load Cogs from cogs folder
     for filename in os.listdir('./cogs'):
@@ -55,6 +63,7 @@ async def load_extensions():
 
 async def main():
     init_db()
+    await catalog.reload()
     await load_extensions()
     await bot.start(TOKEN)
 
@@ -0,0 +1,297 @@
+"""
+Migrasi skema store.db.
+
+Setiap migrasi adalah fungsi yang menerima koneksi dan dijalankan sekali,
+berurutan, oleh database.migrate(). Versi skema disimpan di PRAGMA user_version.
+Jangan mengubah migrasi yang sudah dirilis; tambahkan migrasi baru di akhir MIGRATIONS.
+"""
+import logging
+
+def _table_columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+# 1: skema dasar (sebelumnya dibuat oleh init_db)
+def create_base_schema(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS users (
+        growid TEXT PRIMARY KEY,
+        balance_wl INTEGER DEFAULT 0,
+        balance_dl INTEGER DEFAULT 0,
+        balance_bgl INTEGER DEFAULT 0
+    )
+    ''')
+
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS products (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        code TEXT NOT NULL UNIQUE,
+        price INTEGER NOT NULL,
+        stock INTEGER DEFAULT 0,
+        description TEXT
+    )
+    ''')
+
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS user_products (
+        user_id INTEGER,
+        product TEXT,
+        count INTEGER,
+        PRIMARY KEY (user_id, product)
+    )
+    ''')
+
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS world_info (
+        id INTEGER PRIMARY KEY,
+        world TEXT,
+        owner TEXT,
+        bot TEXT
+    )
+    ''')
+
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS user_growid (
+        user_id INTEGER PRIMARY KEY,
+        growid TEXT
+    )
+    ''')
+
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS purchases (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        order_number INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        product TEXT NOT NULL,
+        quantity INTEGER NOT NULL,
+        total_price INTEGER NOT NULL,
+        purchase_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        buyer_growid TEXT,
+        buyer_name TEXT,
+        UNIQUE(order_number)
+    )
+    ''')
+
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS product_stock (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        product_code TEXT,
+        content TEXT,
+        used INTEGER DEFAULT 0,
+        used_by TEXT DEFAULT NULL,
+        used_at TIMESTAMP DEFAULT NULL,
+        added_by TEXT,
+        added_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        source_file TEXT,
+        FOREIGN KEY (product_code) REFERENCES products (code)
+    )
+    ''')
+
+# 2: store.db lama memakai products(name PRIMARY KEY) tanpa kolom code
+def upgrade_legacy_products(conn):
+    if 'code' in _table_columns(conn, 'products'):
+        return
+
+    # Buat tabel baru lalu ganti nama, supaya referensi FOREIGN KEY
+    # di product_stock tetap menunjuk ke "products"
+    conn.execute('''
+    CREATE TABLE products_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL,
+        code TEXT NOT NULL UNIQUE,
+        price INTEGER NOT NULL,
+        stock INTEGER DEFAULT 0,
+        description TEXT
+    )
+    ''')
+    # Produk lama tidak punya kode; nama dipakai sebagai kode
+    conn.execute('''
+    INSERT INTO products_new (name, code, price, stock, description)
+    SELECT name, name, COALESCE(price, 0), COALESCE(stock, 0), description
+    FROM products
+    ''')
+    conn.execute("DROP TABLE products")
+    conn.execute("ALTER TABLE products_new RENAME TO products")
+
+# 3: indeks untuk query panas (lihat database.hot_queries())
+def create_hot_path_indexes(conn):
+    # Rowid adalah kolom terakhir implisit, jadi item yang belum terjual
+    # (used = 0) membentuk satu rentang berurutan id per produk. Indeks ini
+    # melayani klaim stock, hitungan live stock (covering) dan cek stock.
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_product_stock_code
+    ON product_stock (product_code, used)
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_purchases_user ON purchases (user_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_user_growid_growid ON user_growid (growid)")
+
+# 4: hash isi stock untuk mendeteksi item duplikat saat import
+def add_stock_content_hash(conn):
+    from database import content_hash
+
+    conn.execute("ALTER TABLE product_stock ADD COLUMN content_hash BLOB")
+    conn.create_function('content_hash', 1, content_hash, deterministic=True)
+    conn.execute("UPDATE product_stock SET content_hash = content_hash(content)")
+
+    # Duplikat yang sudah terlanjur ada dibiarkan, tapi hanya baris pertama
+    # yang memegang hash supaya unique index bisa dibuat
+    cursor = conn.execute('''
+    UPDATE product_stock SET content_hash = NULL
+    WHERE content_hash IS NOT NULL AND id NOT IN (
+        SELECT MIN(id) FROM product_stock
+        WHERE content_hash IS NOT NULL
+        GROUP BY content_hash, product_code
+    )
+    ''')
+    if cursor.rowcount:
+        logging.warning(f"{cursor.rowcount} existing duplicate stock rows left without content_hash")
+
+    # content_hash di depan: juga melayani cek duplikat lintas produk
+    conn.execute('''
+    CREATE UNIQUE INDEX ux_product_stock_hash
+    ON product_stock (content_hash, product_code)
+    ''')
+
+# 5: products.stock menjadi penghitung stock tersedia yang dipercaya
+def resync_product_stock(conn):
+    conn.execute('''
+    UPDATE products SET stock = (
+        SELECT COUNT(*) FROM product_stock ps
+        WHERE ps.product_code = products.code AND ps.used = 0
+    )
+    ''')
+
+# 6: key/value kecil untuk state bot yang harus bertahan setelah restart
+def create_bot_state(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS bot_state (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    )
+    ''')
+
+# 7: donasi yang sudah dikredit, untuk menolak kiriman ulang dari game bot
+def create_donations(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS donations (
+        deposit_key TEXT PRIMARY KEY,
+        growid TEXT NOT NULL,
+        amount_wl INTEGER NOT NULL,
+        payload TEXT,
+        received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+# 8: ledger saldo append-only. Saldo DL/BGL dilebur ke balance_wl (satuan
+# dasar WL) dan dicatat sebagai entri 'opening'; balance_dl/balance_bgl
+# tidak dipakai lagi dan dibiarkan 0.
+def create_ledger(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS ledger (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        growid TEXT NOT NULL,
+        delta_wl INTEGER NOT NULL,
+        balance_after INTEGER NOT NULL,
+        kind TEXT NOT NULL,
+        ref TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ledger_growid ON ledger (growid, id)")
+
+    conn.execute('''
+    UPDATE users SET
+        balance_wl = COALESCE(balance_wl, 0) + COALESCE(balance_dl, 0) * 100 + COALESCE(balance_bgl, 0) * 10000,
+        balance_dl = 0,
+        balance_bgl = 0
+    ''')
+    conn.execute('''
+    INSERT INTO ledger (growid, delta_wl, balance_after, kind)
+    SELECT growid, balance_wl, balance_wl, 'opening'
+    FROM users
+    WHERE balance_wl != 0
+    ''')
+
+# 9: penghitung nomor order; diisi dari nomor order terbesar yang sudah ada
+def create_sequences(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS sequences (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    )
+    ''')
+    conn.execute('''
+    INSERT OR IGNORE INTO sequences (name, value)
+    SELECT 'order', COALESCE(MAX(order_number), 0) FROM purchases
+    ''')
+
+# 10: satu order bisa berisi beberapa produk (keranjang), satu baris per produk
+def purchases_unique_per_product(conn):
+    conn.execute('''
+    CREATE TABLE purchases_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        order_number INTEGER NOT NULL,
+        user_id INTEGER NOT NULL,
+        product TEXT NOT NULL,
+        quantity INTEGER NOT NULL,
+        total_price INTEGER NOT NULL,
+        purchase_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        buyer_growid TEXT,
+        buyer_name TEXT,
+        UNIQUE(order_number, product)
+    )
+    ''')
+    new_columns = _table_columns(conn, 'purchases_new')
+    columns = ', '.join(column for column in _table_columns(conn, 'purchases') if column in new_columns)
+    conn.execute(f"INSERT INTO purchases_new ({columns}) SELECT {columns} FROM purchases")
+    conn.execute("DROP TABLE purchases")
+    conn.execute("ALTER TABLE purchases_new RENAME TO purchases")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_purchases_user ON purchases (user_id)")
+
+# 11: arsip item terjual dan antrian penghapusan stock di background
+# (lihat ext/maintenance.py)
+def create_stock_archive(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS product_stock_archive (
+        id INTEGER PRIMARY KEY,
+        product_code TEXT,
+        content TEXT,
+        content_hash BLOB,
+        used_by TEXT,
+        used_at TIMESTAMP,
+        added_by TEXT,
+        added_at TIMESTAMP,
+        source_file TEXT,
+        archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+    # content_hash tetap disimpan supaya import bisa menolak item yang sudah pernah terjual
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_product_stock_archive_hash
+    ON product_stock_archive (content_hash, product_code)
+    ''')
+    # Hanya item terjual yang masuk indeks; ukurannya ikut mengecil saat diarsip
+    conn.execute('''
+    CREATE INDEX IF NOT EXISTS idx_product_stock_used_at
+    ON product_stock (used_at) WHERE used = 1
+    ''')
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS stock_deletions (
+        product_code TEXT PRIMARY KEY,
+        requested_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    ''')
+
+MIGRATIONS = [
+    (1, create_base_schema),
+    (2, upgrade_legacy_products),
+    (3, create_hot_path_indexes),
+    (4, add_stock_content_hash),
+    (5, resync_product_stock),
+    (6, create_bot_state),
+    (7, create_donations),
+    (8, create_ledger),
+    (9, create_sequences),
+    (10, purchases_unique_per_product),
+    (11, create_stock_archive),
+]
@@ -0,0 +1,165 @@
+"""
+Pengiriman pesan Discord di luar jalur transaksi.
+
+Pemanggil meng-commit perubahan database dulu, lalu memanggil
+outbound.enqueue(route, send) dan langsung lanjut. Worker mengirim pesan
+berdasarkan prioritas; setiap route (satu channel atau DM satu user)
+dibatasi jumlah pengiriman paralelnya. Rate limit (429) dan error server
+(5xx) dicoba ulang dengan backoff, dan seluruh route ikut ditahan
+sampai waktunya habis. Pesan yang tetap gagal masuk dead letter.
+"""
+import asyncio
+import itertools
+import logging
+import random
+from collections import deque
+import discord
+
+# Prioritas: angka kecil dikirim lebih dulu
+PRIORITY_DM = 0
+PRIORITY_CHANNEL = 1
+PRIORITY_LOG = 2
+
+WORKERS = 8
+ROUTE_CONCURRENCY = {'dm': 1, 'channel': 2}
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 1.0   # detik, digandakan setiap percobaan
+BACKOFF_MAX = 60.0
+DEAD_LETTER_LIMIT = 100
+
+def dm_route(user):
+    return ('dm', user.id)
+
+def channel_route(channel):
+    return ('channel', channel.id)
+
+class Job:
+    def __init__(self, route, send, priority, description, future):
+        self.route = route
+        self.send = send  # async callable tanpa argumen; dipanggil ulang saat retry
+        self.priority = priority
+        self.description = description
+        self.future = future
+        self.attempts = 0
+        self.sequence = None
+
+class _Route:
+    def __init__(self, limit):
+        self.semaphore = asyncio.Semaphore(limit)
+        self.blocked_until = 0.0
+        self.jobs = 0
+
+class Outbound:
+    def __init__(self, workers=WORKERS):
+        self.workers = workers
+        self._queue = None
+        self._tasks = []
+        self._routes = {}
+        self._sequence = itertools.count()
+        self.sent = 0
+        self.retried = 0
+        self.dead_letters = deque(maxlen=DEAD_LETTER_LIMIT)
+
+    def _start(self):
+        self._queue = asyncio.PriorityQueue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def enqueue(self, route, send, priority=PRIORITY_CHANNEL, description=''):
+        """
+        Jadwalkan `await send()` pada route tertentu. Kembalikan future yang
+        selesai dengan True setelah terkirim atau False bila masuk dead letter;
+        pemanggil boleh mengabaikannya.
+        """
+        if self._queue is None:
+            self._start()
+        future = asyncio.get_running_loop().create_future()
+        job = Job(route, send, priority, description or str(route), future)
+        state = self._routes.get(route)
+        if state is None:
+            state = self._routes[route] = _Route(ROUTE_CONCURRENCY.get(route[0], 1))
+        state.jobs += 1
+        job.sequence = next(self._sequence)
+        self._put(job)
+        return future
+
+    def _put(self, job):
+        # Urutan enqueue dipertahankan saat retry, jadi pesan satu route tetap berurutan
+        self._queue.put_nowait((job.priority, job.sequence, job))
+
+    def _finish(self, job, delivered):
+        state = self._routes[job.route]
+        state.jobs -= 1
+        if state.jobs == 0:
+            del self._routes[job.route]
+        if not job.future.done():
+            job.future.set_result(delivered)
+
+    def _hold(self, job, state):
+        # Semua job yang ditahan di route ini masuk antrian lagi pada saat
+        # yang sama, lalu diurutkan ulang menurut sequence
+        asyncio.get_running_loop().call_at(state.blocked_until, self._put, job)
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            _, _, job = await self._queue.get()
+            state = self._routes[job.route]
+            if state.blocked_until > loop.time():
+                # Route masih dalam backoff; route lain tetap jalan
+                self._hold(job, state)
+                continue
+            async with state.semaphore:
+                if state.blocked_until > loop.time():
+                    # Route diblokir selama job ini menunggu giliran; jangan
+                    # mendahului job yang sedang di-retry
+                    self._hold(job, state)
+                    continue
+                job.attempts += 1
+                try:
+                    await job.send()
+                except discord.HTTPException as e:
+                    self._failed(job, state, e)
+                    continue
+                except Exception as e:
+                    self._dead_letter(job, e)
+                    continue
+            self.sent += 1
+            self._finish(job, True)
+
+    def _failed(self, job, state, error):
+        retryable = error.status == 429 or error.status >= 500
+        if not retryable or job.attempts >= MAX_ATTEMPTS:
+            self._dead_letter(job, error)
+            return
+        delay = min(BACKOFF_BASE * 2 ** (job.attempts - 1), BACKOFF_MAX) * (1 + random.random() / 2)
+        retry_after = getattr(error, 'retry_after', None)
+        if error.status == 429 and retry_after:
+            delay = max(delay, retry_after)
+        # Semua pesan di route ini menunggu, bukan hanya yang gagal
+        state.blocked_until = max(state.blocked_until, asyncio.get_running_loop().time() + delay)
+        logging.warning(f"Outbound {job.description} failed with {error.status}; retry {job.attempts} in {delay:.1f}s")
+        self.retried += 1
+        self._hold(job, state)
+
+    def _dead_letter(self, job, error):
+        logging.error(f"Outbound {job.description} dropped after {job.attempts} attempts: {error}")
+        self.dead_letters.append((job.description, job.attempts, repr(error)))
+        self._finish(job, False)
+
+    def stats(self):
+        return {
+            'queued': self._queue.qsize() if self._queue else 0,
+            'routes': len(self._routes),
+            'sent': self.sent,
+            'retried': self.retried,
+            'dead_letters': len(self.dead_letters),
+        }
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+outbound = Outbound()
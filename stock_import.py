@@ -0,0 +1,192 @@
+"""
+Import stock secara streaming.
+
+File (atau isi attachment) dibaca per chunk, baris kosong dilewati, dan item
+dimasukkan dengan executemany per batch di dalam satu transaksi. Item yang isinya
+sudah ada (berdasarkan content_hash) dilewati dan dihitung sebagai duplikat,
+termasuk item terjual yang sudah dipindah ke product_stock_archive.
+Dipakai oleh perintah !addStock dan bisa dijalankan offline:
+
+    python stock_import.py <kode_produk> <file> [--added-by NAMA] [--batch-size N] [--dedup global] [--no-archive-check]
+"""
+import argparse
+import codecs
+import logging
+import sys
+import time
+import database
+from database import content_hash
+
+CHUNK_SIZE = 1024 * 1024  # byte per pembacaan
+BATCH_SIZE = 5000         # baris per executemany
+
+# 'product': item dianggap duplikat bila sudah ada di produk yang sama
+# 'global': item dianggap duplikat bila sudah ada di produk mana pun
+DEDUP_SCOPE = 'product'
+# Item yang sudah terjual dan diarsip tetap dianggap duplikat
+DEDUP_ARCHIVE = True
+
+SQL_INSERT_ITEM = """
+    INSERT OR IGNORE INTO product_stock (
+        product_code, content, added_by, source_file, content_hash
+    ) VALUES (?, ?, ?, ?, ?)
+"""
+
+SQL_INSERT_ITEM_GLOBAL = """
+    INSERT OR IGNORE INTO product_stock (
+        product_code, content, added_by, source_file, content_hash
+    )
+    SELECT ?, ?, ?, ?, ?
+    WHERE NOT EXISTS (SELECT 1 FROM product_stock WHERE content_hash = ?)
+"""
+
+SQL_INSERT_ITEM_UNARCHIVED = """
+    INSERT OR IGNORE INTO product_stock (
+        product_code, content, added_by, source_file, content_hash
+    )
+    SELECT ?, ?, ?, ?, ?
+    WHERE NOT EXISTS (SELECT 1 FROM product_stock_archive WHERE content_hash = ? AND product_code = ?)
+"""
+
+SQL_INSERT_ITEM_GLOBAL_UNARCHIVED = """
+    INSERT OR IGNORE INTO product_stock (
+        product_code, content, added_by, source_file, content_hash
+    )
+    SELECT ?, ?, ?, ?, ?
+    WHERE NOT EXISTS (SELECT 1 FROM product_stock WHERE content_hash = ?)
+    AND NOT EXISTS (SELECT 1 FROM product_stock_archive WHERE content_hash = ?)
+"""
+
+SQL_PRODUCT_EXISTS = "SELECT 1 FROM products WHERE code = ?"
+SQL_ADD_PRODUCT_STOCK = "UPDATE products SET stock = stock + ? WHERE code = ?"
+
+# (global_scope, check_archive) -> sql
+INSERT_SQL = {
+    (False, False): SQL_INSERT_ITEM,
+    (True, False): SQL_INSERT_ITEM_GLOBAL,
+    (False, True): SQL_INSERT_ITEM_UNARCHIVED,
+    (True, True): SQL_INSERT_ITEM_GLOBAL_UNARCHIVED,
+}
+
+class UnknownProduct(Exception):
+    def __init__(self, product_code):
+        super().__init__(f"Product with code {product_code} does not exist.")
+        self.product_code = product_code
+
+def iter_lines(stream, chunk_size=CHUNK_SIZE, encoding='utf-8-sig'):
+    """Yield baris yang tidak kosong (sudah di-strip) dari stream biner."""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        lines = (pending + decoder.decode(chunk)).split('\n')
+        pending = lines.pop()
+        for line in lines:
+            line = line.strip()
+            if line:
+                yield line
+    pending = (pending + decoder.decode(b'', final=True)).strip()
+    if pending:
+        yield pending
+
+def import_stock(conn, product_code, lines, added_by, source_file, batch_size=BATCH_SIZE,
+                 progress=None, dedup_scope=DEDUP_SCOPE, check_archive=DEDUP_ARCHIVE):
+    """
+    Masukkan setiap baris dari `lines` sebagai item stock dan kembalikan
+    (jumlah ditambahkan, jumlah duplikat dilewati). Harus dipanggil di dalam
+    transaksi (Database.write). `progress(added, duplicates)` dipanggil setelah
+    setiap batch, dari thread yang menjalankan import.
+    """
+    if not conn.execute(SQL_PRODUCT_EXISTS, (product_code,)).fetchone():
+        raise UnknownProduct(product_code)
+
+    global_scope = dedup_scope == 'global'
+    sql = INSERT_SQL[global_scope, bool(check_archive)]
+    seen = set()  # hash dari baris di file ini, untuk duplikat di dalam file
+    added = 0
+    duplicates = 0
+    batch = []
+
+    for content in lines:
+        digest = content_hash(content)
+        if digest in seen:
+            duplicates += 1
+            continue
+        seen.add(digest)
+        row = (product_code, content, added_by, source_file, digest)
+        if global_scope:
+            row += (digest,)
+        if check_archive:
+            row += (digest,) if global_scope else (digest, product_code)
+        batch.append(row)
+
+        if len(batch) >= batch_size:
+            inserted = _insert_batch(conn, sql, batch)
+            added += inserted
+            duplicates += len(batch) - inserted
+            batch = []
+            if progress:
+                progress(added, duplicates)
+    if batch:
+        inserted = _insert_batch(conn, sql, batch)
+        added += inserted
+        duplicates += len(batch) - inserted
+        if progress:
+            progress(added, duplicates)
+
+    conn.execute(SQL_ADD_PRODUCT_STOCK, (added, product_code))
+    return added, duplicates
+
+def _insert_batch(conn, sql, batch):
+    # Baris yang bentrok dengan ux_product_stock_hash diabaikan; rowcount
+    # executemany adalah jumlah baris yang benar-benar masuk
+    return conn.executemany(sql, batch).rowcount
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import stock items from a text file (one item per line).")
+    parser.add_argument('product_code')
+    parser.add_argument('file')
+    parser.add_argument('--added-by', default='cli')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--dedup', choices=('product', 'global'), default=DEDUP_SCOPE)
+    parser.add_argument('--no-archive-check', dest='check_archive', action='store_false',
+                        help="accept items that were already sold and archived")
+    args = parser.parse_args(argv)
+
+    database.init_db()
+    conn = database.get_connection()
+    if conn is None:
+        return 1
+    conn.isolation_level = None
+    started = time.monotonic()
+
+    def report(added, duplicates):
+        rate = (added + duplicates) / max(time.monotonic() - started, 1e-9)
+        print(f"\r{added:,} items, {duplicates:,} duplicates ({rate:,.0f} lines/s)", end='', file=sys.stderr)
+
+    try:
+        with open(args.file, 'rb') as stream:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                added, duplicates = import_stock(conn, args.product_code, iter_lines(stream), args.added_by,
+                                                 args.file, batch_size=args.batch_size, progress=report,
+                                                 dedup_scope=args.dedup, check_archive=args.check_archive)
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+    except (OSError, UnknownProduct) as e:
+        print(f"\nError: {e}", file=sys.stderr)
+        return 1
+    finally:
+        conn.close()
+
+    print(f"\nImported {added:,} items into {args.product_code} ({duplicates:,} duplicates skipped) "
+          f"in {time.monotonic() - started:.1f}s", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,80 @@
+import random
+import timeit
+import pytest
+from deposit_parser import parse_deposit, normalize_lock_name, LOCK_VALUES, MAX_QUANTITY
+
+@pytest.mark.parametrize('deposit, total_wl', [
+    ("1 World Lock", 1),
+    ("5 World Lock, 2 Diamond Lock, 1 Blue Gem Lock", 10205),
+    ("120 World Locks, 15 Diamond Locks, 3 Blue Gem Locks", 31620),
+    ("2 DL, 1 BGL, 7 wl", 10207),
+    ("3x Diamond Lock", 300),
+    ("4  blue   gem  LOCKS", 40000),
+    ("1,000 World Lock", 1000),
+    ("1,000,000 WL, 2 DL", 1000200),
+    ("12,345 x DL", 1234500),
+    ("5 WL,100 DL", 10005),
+])
+def test_known_deposits(deposit, total_wl):
+    result = parse_deposit(deposit)
+    assert result.total_wl == total_wl
+    assert result.clean
+
+def test_unknown_lock_is_reported():
+    result = parse_deposit("5 World Lock, 2 Platinum Locks")
+    assert result.total_wl == 5
+    assert result.unknown == {'platinum locks': 2}
+    assert not result.clean
+
+@pytest.mark.parametrize('deposit, rejected', [
+    ("5 WL, ???", ['???']),
+    ("1, 000 World Lock", ['1']),
+    ("1,0000 World Lock", ['1']),
+    ("-5 WL", ['-5 WL']),
+    ("1.5 DL", ['1.5 DL']),
+    (f"{MAX_QUANTITY + 1} WL", [f"{MAX_QUANTITY + 1} WL"]),
+])
+def test_invalid_fragments_are_rejected(deposit, rejected):
+    result = parse_deposit(deposit)
+    assert result.rejected == rejected
+    assert not result.clean
+
+def test_empty_deposit():
+    result = parse_deposit("")
+    assert result.total_wl == 0
+    assert result.clean
+
+@pytest.mark.parametrize('seed', range(5))
+def test_random_payloads(seed, iterations=4000):
+    rng = random.Random(seed)
+    names = ['World Lock', 'World Locks', 'Diamond Lock', 'DLs', 'BGL', 'Blue Gem Locks', 'Gold Lock', 'wl']
+    junk = ['', ' ', ',', ',,', 'abc', '-5', '1.5', '\n', '💎', 'x', '99999999999']
+
+    for _ in range(iterations):
+        fragments = []
+        expected = 0
+        valid = True
+        for _ in range(rng.randint(0, 6)):
+            if rng.random() < 0.7:
+                quantity = rng.randint(0, 5000000)
+                name = rng.choice(names)
+                number = f"{quantity:,}" if rng.random() < 0.3 else str(quantity)
+                fragments.append(f"{number}{rng.choice(['', ' ', '  ', ' x '])}{name}")
+                expected += quantity * LOCK_VALUES.get(normalize_lock_name(name), 0)
+            else:
+                fragments.append(rng.choice(junk))
+                valid = False
+        payload = rng.choice([',', ', ', ' ,']).join(fragments)
+
+        result = parse_deposit(payload)  # tidak boleh raise
+        assert result.total_wl >= 0, payload
+        if valid:
+            assert result.total_wl == expected, (payload, result)
+            assert not result.rejected, (payload, result)
+        assert all(',' not in fragment for fragment in result.rejected), (payload, result)
+
+def test_parse_cost():
+    # Batas longgar; parser biasanya butuh beberapa mikrodetik per payload
+    payload = "120 World Locks, 15 Diamond Locks, 3 Blue Gem Locks, 2 Platinum Locks, ???"
+    runs, total = timeit.Timer(lambda: parse_deposit(payload)).autorange()
+    assert total / runs < 1e-3
@@ -0,0 +1,38 @@
+import sqlite3
+import pytest
+import database
+
+@pytest.fixture
+def conn():
+    conn = database.configure_connection(sqlite3.connect(':memory:'))
+    database.migrate(conn)
+    yield conn
+    conn.close()
+
+def test_migrations_reach_latest_version(conn):
+    assert database.schema_version(conn) == database.MIGRATIONS[-1][0]
+
+def test_hot_queries_use_indexes(conn):
+    assert database.check_query_plans(conn) == []
+
+def test_hot_queries_cover_code_paths():
+    import catalog
+    import stock_import
+    from ext import balance_manager
+
+    checked = {sql for sql, _, _ in database.hot_queries().values()}
+    for sql in (
+        database.SQL_CLAIM_ITEMS,
+        database.SQL_TAKE_PRODUCT_STOCK,
+        database.SQL_RECENT_DONATION,
+        balance_manager.SQL_DEBIT,
+        balance_manager.SQL_CREDIT,
+        catalog.SQL_PRODUCT,
+        *stock_import.INSERT_SQL.values(),
+    ):
+        assert sql in checked
+
+def test_missing_index_is_reported(conn):
+    conn.execute("DROP INDEX idx_product_stock_code")
+    regressions = database.check_query_plans(conn)
+    assert 'claim_items' in {name for name, _ in regressions}